@@ -0,0 +1,111 @@
+"""
+This is a file for loading the images microgames use.
+Microgames declare their assets in asset_paths, which lets them be loaded on a worker thread before the game runs.
+Loaded images are converted to the display's pixel format once, and shared between games with reference counts
+"""
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+import resources
+
+class AssetManager:
+    """
+    Loads, converts and caches images, keyed by path
+    """
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+
+        #path -> Future, for images being loaded on a worker thread
+        self.loading = {}
+        #path -> surface
+        self.surfaces = {}
+        #paths whose surfaces have been converted to the display format
+        self.converted = set()
+        #path -> how many games are using it
+        self.ref_counts = {}
+        #path -> how many preloads haven't been acquired or cancelled yet. These hold on to images like references do
+        self.preloads = {}
+
+    def preload(self, asset_paths):
+        """
+        Start loading images in the background. asset_paths is a dict of name -> path, like Microgame.asset_paths.
+        The images are kept until they're acquired and released, or the preload is cancelled
+        """
+        for path in asset_paths.values():
+            self.preloads[path] = self.preloads.get(path, 0) + 1
+            if path not in self.surfaces and path not in self.loading:
+                self.loading[path] = self.executor.submit(pygame.image.load, path)
+
+    def cancel_preload(self, asset_paths):
+        """
+        Let go of preloaded images that won't be acquired after all
+        """
+        for path in asset_paths.values():
+            if self.preloads.get(path):
+                self.preloads[path] -= 1
+            self.drop_if_unused(path)
+
+    def get_surface(self, path):
+        """
+        Get the surface for a path, waiting for it to load (or loading it now) if needed.
+        This has to be called from the main thread
+        """
+        surf = self.surfaces.get(path)
+        if surf is None:
+            future = self.loading.pop(path, None)
+            if future:
+                surf = future.result()
+            else:
+                surf = pygame.image.load(path)
+            self.surfaces[path] = surf
+
+        #blits are much faster when the surface matches the display
+        if path not in self.converted and pygame.display.get_surface() is not None:
+            if surf.get_flags() & pygame.SRCALPHA:
+                surf = surf.convert_alpha()
+            else:
+                surf = surf.convert()
+            self.surfaces[path] = surf
+            self.converted.add(path)
+
+        return surf
+
+    def acquire(self, asset_paths):
+        """
+        Get the surfaces for a dict of name -> path, holding on to them until they're released
+        """
+        assets = {}
+        for name, path in asset_paths.items():
+            #a preload of this path (if there is one) becomes this reference
+            if self.preloads.get(path):
+                self.preloads[path] -= 1
+            self.ref_counts[path] = self.ref_counts.get(path, 0) + 1
+            assets[name] = self.get_surface(path)
+        return assets
+
+    def get_memory_usage(self):
+        """
+        Get how many bytes of pixels the loaded images take up
+        """
+        return sum(resources.get_surface_bytes(surf) for surf in self.surfaces.values())
+
+    def release(self, asset_paths):
+        """
+        Stop holding on to some surfaces. Once nothing holds on to a surface it is dropped
+        """
+        for path in asset_paths.values():
+            self.ref_counts[path] -= 1
+            self.drop_if_unused(path)
+
+    def drop_if_unused(self, path):
+        if self.ref_counts.get(path, 0) > 0 or self.preloads.get(path, 0) > 0:
+            return
+        self.ref_counts.pop(path, None)
+        self.preloads.pop(path, None)
+        self.surfaces.pop(path, None)
+        future = self.loading.pop(path, None)
+        if future:
+            future.cancel()
+        self.converted.discard(path)
+
+#the asset manager everything shares
+manager = AssetManager()
@@ -0,0 +1,638 @@
+"""
+This is a file for benchmarks. They run headless, so they can be run anywhere:
+    python benchmarks.py <benchmark name>
+"""
+import os
+import sys
+import time
+import math
+import json
+import argparse
+import importlib
+
+#run without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import global_values as g
+
+def init_headless():
+    """
+    Set up pygame and the display like main.py does, without opening a window
+    """
+    pygame.init()
+    if g.screen is None:
+        g.screen = pygame.display.set_mode((g.WIDTH, g.HEIGHT))
+
+def get_percentile(sorted_times, percentile):
+    """
+    Get a percentile from a sorted list of times
+    """
+    if not sorted_times:
+        return 0.0
+    index = min(int(len(sorted_times)*percentile/100), len(sorted_times)-1)
+    return sorted_times[index]
+
+def time_frames(function, frames):
+    """
+    Call function once per frame and return the sorted frame times in milliseconds
+    """
+    times = []
+    for frame in range(frames):
+        start = time.perf_counter()
+        function(frame)
+        times.append((time.perf_counter()-start)*1000)
+    times.sort()
+    return times
+
+def print_times(name, times):
+    print(f"{name:<32} mean {sum(times)/len(times):8.4f}ms  p50 {get_percentile(times, 50):8.4f}ms  p99 {get_percentile(times, 99):8.4f}ms")
+
+def bench_text_boxes(count=100, frames=1000):
+    """
+    Per-frame cost of keeping text boxes bound to changing values up to date.
+    The value changes every 10 frames, like a countdown showing centiseconds at 600fps would.
+    The eval line shows what evaluating the old string bindings every frame cost, for comparison
+    """
+    import controls
+    import bindings
+
+    init_headless()
+    font = pygame.font.Font(None, 32)
+
+    clock = bindings.Observable(0)
+    text_boxes = [controls.TextBox((0, 0), lambda: clock.value // 10, font, 0, "white", set(("benchmark",))) for i in range(count)]
+
+    def frame(i):
+        clock.set(i)
+        bindings.invalidate()
+        for text_box in text_boxes:
+            text_box.update(g.frame_input)
+
+    print_times(f"{count} bound text boxes", time_frames(frame, frames))
+
+    namespace = {"clock":clock}
+    def eval_frame(i):
+        clock.set(i)
+        for text_box in text_boxes:
+            str(eval("clock.value // 10", namespace))
+
+    print_times(f"{count} eval strings (no rendering)", time_frames(eval_frame, frames))
+
+    for text_box in text_boxes:
+        text_box.delete()
+
+def bench_timer_text(frames=1000):
+    """
+    Per-frame cost of a countdown that changes every frame, updated and drawn, rendered with the font vs drawn from a glyph atlas
+    """
+    import controls
+    import bindings
+
+    init_headless()
+    font = pygame.font.Font(None, 32)
+
+    for use_glyphs in (False, True):
+        clock = bindings.Observable(0)
+        text_box = controls.TextBox((g.WIDTH/2, 0), lambda: f"{str(clock.value//100).zfill(2)}:{str(clock.value%100).zfill(2)}", font, 0, "white", set(("benchmark",)), use_glyphs=use_glyphs)
+
+        def frame(i):
+            clock.set(9999-i)
+            bindings.invalidate()
+            text_box.update(g.frame_input)
+            text_box.draw()
+
+        print_times(f"timer text, {'glyph atlas' if use_glyphs else 'font.render'}", time_frames(frame, frames))
+        text_box.delete()
+
+def bench_gallery(counts=(50, 1000, 10000), frames=600):
+    """
+    Per-frame cost of updating and drawing the gallery while scrolling through it, for different numbers of games.
+    With the grid only looking at visible rows, this should be about the same for every count
+    """
+    import controls
+    import registry
+    import test_game
+
+    init_headless()
+    g.state = "gallery"
+    game = registry.get_entry(test_game.TestGame)
+
+    for count in counts:
+        gallery = controls.Gallery(pygame.Rect(0, 50, g.WIDTH, g.HEIGHT), [game]*count, set(("gallery",)))
+
+        def frame(i):
+            #scroll down and back up again
+            gallery.scrollbar.scroll_value = abs( ((i/frames)*2) - 1 )
+            gallery.update(g.frame_input)
+            gallery.draw()
+
+        print_times(f"gallery with {count} games", time_frames(frame, frames))
+
+        gallery.scrollbar.delete()
+        gallery.delete()
+
+def bench_timers(counts=(100, 10000, 100000), frames=600):
+    """
+    Per-frame cost of the timer scheduler with many timers running.
+    Every frame, a few timers are cancelled and replaced, and the clock moves forward by 16ms
+    """
+    import random
+    from timers import TimerScheduler
+
+    for count in counts:
+        scheduler = TimerScheduler()
+        timers = [scheduler.add(random.randint(1, 60000), int) for i in range(count)]
+
+        def frame(i):
+            for j in range(10):
+                index = random.randrange(count)
+                timers[index].cancel()
+                timers[index] = scheduler.add(random.randint(1, 60000), int)
+            scheduler.update(16)
+
+        print_times(f"{count} timers", time_frames(frame, frames))
+
+def bench_scaling(window_size=(1920, 1080), frames=600):
+    """
+    Per-frame cost of showing the screen in each scale mode, with a 1080p window.
+    Small dirty rects are what a normal frame looks like, full redraws are the worst case
+    """
+    from display import display
+
+    pygame.init()
+    for mode in (None, "integer", "fit"):
+        display.open(mode, window_size)
+        dirty_rect = pygame.Rect(100, 100, 300, 300)
+
+        print_times(f"{mode} scaling, dirty rect", time_frames(lambda i: display.present(False, dirty_rect), frames))
+        print_times(f"{mode} scaling, full redraw", time_frames(lambda i: display.present(True, dirty_rect), frames))
+
+    g.screen = None
+
+def bench_rotations(count=400, games=("test_game.TestGame", "microgame.Microgame"), report_every=100):
+    """
+    Memory used while playing many microgames one after another, like a kiosk left running for days.
+    Each game runs for a few frames, is won, and plays until it ends. Memory should stay flat
+    """
+    import tracemalloc
+    import main
+    from resources import tracker
+
+    pygame.init()
+    main.setup()
+    game_classes = [load_game_class(game) for game in games]
+
+    def rotate(i):
+        game = game_classes[i % len(game_classes)]()
+        game.run()
+        for frame in range(10):
+            main.run_frame(16)
+        game.win()
+        while game.running:
+            main.run_frame(16)
+
+    #warm up caches (fonts, pools, etc)
+    for i in range(len(game_classes)*4):
+        rotate(i)
+
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(count):
+        rotate(i)
+        if (i+1) % report_every == 0:
+            stats = tracker.get_stats()
+            print(f"{i+1:>6} games: python memory {(tracemalloc.get_traced_memory()[0]-start_memory)/1024:+8.1f}KB, "
+                  f"{len(g.controls)} controls, {len(g.timers)} timers, {stats['loaded_games']} loaded games, "
+                  f"{stats['asset_bytes']/1024:.0f}KB assets, {stats['pooled_surface_bytes']/1024:.0f}KB pooled surfaces")
+    tracemalloc.stop()
+    print(f"{count} games in {time.perf_counter()-start:.1f}s")
+
+def check_draw_allocations(game="microgame.Microgame", frames=200, warmup_frames=10):
+    """
+    Check that main.draw doesn't allocate any Python objects that outlive the frame, and report the peak memory it
+    allocates while drawing. Returns True if nothing was left allocated.
+    The microgame's own draw is included, so use a game whose draw doesn't allocate
+    """
+    import tracemalloc
+    import main
+    import bindings
+
+    pygame.init()
+    main.setup()
+    load_game_class(game)().run()
+
+    for frame in range(warmup_frames):
+        main.handle_input()
+        bindings.invalidate()
+        main.run_updates(16)
+        main.draw()
+
+    tracemalloc.start()
+    blocks = 0
+    peak = 0
+    for frame in range(frames):
+        main.handle_input()
+        bindings.invalidate()
+        main.run_updates(16)
+
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        main.draw()
+        blocks += len(tracemalloc.take_snapshot().traces)
+        peak = max(peak, tracemalloc.get_traced_memory()[1]-start)
+    tracemalloc.stop()
+
+    print(f"main.draw with {game}: {blocks/frames:.2f} blocks left allocated per frame, {peak} bytes peak")
+    return blocks == 0
+
+def load_game_class(name):
+    """
+    Import a microgame class from a name like "test_game.TestGame"
+    """
+    module_name, class_name = name.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+def get_default_script(frame):
+    """
+    The default input script. The mouse circles the middle of the screen, clicking every 30 frames
+    """
+    angle = frame*0.05
+    radius = 100
+    pos = ( int((g.WIDTH/2) + (math.cos(angle)*radius)), int((g.HEIGHT/2) + (math.sin(angle)*radius)) )
+
+    events = [pygame.event.Event(pygame.MOUSEMOTION, {"pos":pos, "rel":(0,0), "buttons":(0,0,0)})]
+    if frame % 30 == 0:
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, {"pos":pos, "button":1}))
+    elif frame % 30 == 5:
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, {"pos":pos, "button":1}))
+    return events
+
+def load_script(path):
+    """
+    Load an input script from a JSON file like
+    {"length":60, "events":[{"frame":0, "type":"MOUSEBUTTONDOWN", "pos":[250,250], "button":1}, ...]}
+    The script repeats every "length" frames
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    frames = {}
+    for event_data in data["events"]:
+        event_data = dict(event_data)
+        frame = event_data.pop("frame")
+        event_type = getattr(pygame, event_data.pop("type"))
+        for key, value in event_data.items():
+            if isinstance(value, list):
+                event_data[key] = tuple(value)
+        frames.setdefault(frame, []).append( (event_type, event_data) )
+
+    def script(frame):
+        return [pygame.event.Event(event_type, event_data) for event_type, event_data in frames.get(frame % data["length"], ())]
+    return script
+
+def get_stats(times):
+    times = sorted(times)
+    return {
+        "mean":sum(times)/len(times),
+        "p50":get_percentile(times, 50),
+        "p95":get_percentile(times, 95),
+        "p99":get_percentile(times, 99),
+    }
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Get a list of descriptions of every phase whose p95 frame time is worse than the baseline by more than tolerance
+    """
+    regressions = []
+    for phase, stats in results["phases"].items():
+        baseline_stats = baseline["phases"].get(phase)
+        if baseline_stats and stats["p95"] > baseline_stats["p95"]*(1+tolerance):
+            regressions.append(f"{phase} p95 {stats['p95']:.4f}ms, baseline {baseline_stats['p95']:.4f}ms")
+    return regressions
+
+def check_click_edges(game_class, dt=16, frames=10):
+    """
+    Click once, and count how many of the game's updates see the click in buttons_pressed.
+    Frames go through main.run_frame, so the fixed timestep can run several updates (or none) a frame.
+    Should be exactly 1
+    """
+    import main
+
+    if g.current_game:
+        g.current_game.end()
+    game = game_class()
+    game.run()
+
+    seen = []
+    def update(delta):
+        seen.append(1 in game.get_input().buttons_pressed)
+        game_class.update(game, delta)
+    game.update = update
+
+    pos = game.rect.center
+    for frame in range(frames):
+        if frame == 1:
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+        elif frame == 2:
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1))
+        main.run_frame(dt)
+        if not game.running:
+            break
+
+    if game.running:
+        game.end()
+    return sum(seen)
+
+def bench_game(game="test_game.TestGame", frames=600, dt=16, script=None, allocation_frames=100, output=None, baseline=None, tolerance=0.1):
+    """
+    Run a microgame through the main loop with scripted input, timing handle_input, update and draw separately.
+    The game is restarted whenever it ends.
+    Returns True if there were no regressions compared to the baseline
+    """
+    import tracemalloc
+    import main
+    import bindings
+
+    pygame.init()
+    main.setup()
+
+    game_class = load_game_class(game)
+    if script is None:
+        get_events = get_default_script
+    else:
+        get_events = load_script(script)
+
+    def run_frame(frame, times=None):
+        if g.current_game is None:
+            game_class().run()
+        for event in get_events(frame):
+            pygame.event.post(event)
+
+        start = time.perf_counter()
+        main.handle_input()
+        input_end = time.perf_counter()
+        bindings.invalidate()
+        main.update(dt)
+        update_end = time.perf_counter()
+        main.draw()
+        draw_end = time.perf_counter()
+
+        if times is not None:
+            times["handle_input"].append((input_end-start)*1000)
+            times["update"].append((update_end-input_end)*1000)
+            times["draw"].append((draw_end-update_end)*1000)
+            times["frame"].append((draw_end-start)*1000)
+
+    times = {"handle_input":[], "update":[], "draw":[], "frame":[]}
+    for frame in range(frames):
+        run_frame(frame, times)
+
+    #count allocations separately, as tracing them slows everything down
+    tracemalloc.start()
+    blocks = []
+    peaks = []
+    for frame in range(frames, frames+allocation_frames):
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        run_frame(frame)
+        #blocks allocated during the frame that are still alive at the end of it
+        blocks.append(len(tracemalloc.take_snapshot().traces))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    results = {
+        "game":game,
+        "frames":frames,
+        "dt":dt,
+        "phases":{phase:get_stats(phase_times) for phase, phase_times in times.items()},
+        "allocations":{
+            "blocks_per_frame":sum(blocks)/len(blocks),
+            "peak_bytes_per_frame":sum(peaks)/len(peaks),
+        },
+    }
+
+    for phase, phase_times in times.items():
+        print_times(f"{game} {phase}", sorted(phase_times))
+
+    #one click has to be seen by exactly one update, however many updates each frame runs
+    clicks_seen = check_click_edges(game_class, dt)
+    results["clicks_seen"] = clicks_seen
+    print(f"{game} one click seen by {clicks_seen} updates with dt {dt}ms")
+    print(f"{game} allocations {results['allocations']['blocks_per_frame']:.1f} blocks/frame, peak {results['allocations']['peak_bytes_per_frame']:.0f} bytes/frame")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if clicks_seen != 1:
+        print(f"FAILED: one click was seen by {clicks_seen} updates")
+        return False
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return not regressions
+
+    return True
+
+def bench_buttons(counts=(100, 500, 2000)):
+    """
+    How long it takes to build a menu of buttons, like a level select.
+    Buttons come in a few sizes and styles, so after the first few everything comes from the theme cache
+    """
+    import controls
+    import theme
+
+    init_headless()
+    font = pygame.font.Font(None, 32)
+    sizes = ((128, 64), (100, 50), (64, 64), (200, 48))
+
+    for count in counts:
+        #start with nothing cached, so the first frames of each size are counted too
+        theme.theme.__init__()
+        start = time.perf_counter()
+        buttons = [controls.create_button(pygame.Rect((0, 0), sizes[i % len(sizes)]), str(i % 50), font, int, "red", "white",
+                                          set(("benchmark",)), border_width=4, border_radius=8) for i in range(count)]
+        elapsed = (time.perf_counter()-start)*1000
+
+        frames = set(id(surf) for button in buttons for surf in (button.unpressed_gfx, button.highlighted_gfx, button.pressed_gfx))
+        print(f"{count} buttons: {elapsed:8.2f}ms to build, {len(frames)} frame surfaces shared between them")
+
+        for button in buttons:
+            button.delete()
+
+def bench_sprites(counts=(100, 1000, 5000), frames=300):
+    """
+    Per-frame cost of drawing a microgame with a background like TestGame's and many small moving images,
+    drawn the usual way (everything drawn and blitted one at a time) vs with sprites.py layers
+    """
+    import random
+    import sprites
+
+    init_headless()
+    size = (300, 300)
+    surf = pygame.Surface(size)
+    image = pygame.Surface((8, 8))
+    image.fill("red")
+
+    def draw_background(target):
+        target.fill("gray")
+        for i in range(8):
+            pygame.draw.circle(target, "red" if i%2 else "white", (150, 150), 4*i, 4)
+
+    for count in counts:
+        positions = [(random.randrange(size[0]), random.randrange(size[1])) for i in range(count)]
+
+        def frame(i):
+            draw_background(surf)
+            for x, y in positions:
+                surf.blit(image, ((x+i) % size[0], y))
+
+        print_times(f"{count} images, one at a time", time_frames(frame, frames))
+
+        layers = sprites.LayerStack([sprites.StaticLayer(size, draw_background), sprites.SpriteLayer()])
+        sprite_list = [layers[1].add(image, position) for position in positions]
+
+        def layer_frame(i):
+            for sprite, (x, y) in zip(sprite_list, positions):
+                sprite.pos = ((x+i) % size[0], y)
+            layers.draw(surf)
+
+        print_times(f"{count} images, layers", time_frames(layer_frame, frames))
+        print_times(f"{count} images, layers, still", time_frames(lambda i: layers.draw(surf), frames))
+        layers.release()
+
+def bench_collision(counts=(10, 1000, 100000), frames=20):
+    """
+    Per-frame cost of hit tests with different numbers of targets, done with scalar Python like TestGame.fire vs collision.py.
+    "click" checks the mouse against every target, "pairs" checks as many projectiles against the targets.
+    The field grows with the count so each projectile is near about as many targets, and scalar pairs are skipped
+    once they'd take too long
+    """
+    import random
+    import numpy as np
+    import collision
+
+    def get_distance(x1, y1, x2, y2):
+        x = x2-x1
+        y = y2-y1
+        return ((x**2)+(y**2))**0.5
+
+    target_radius = 8
+    projectile_radius = 2
+    for count in counts:
+        field = 300*max(1, math.sqrt(count/100))
+        targets = [(random.uniform(0, field), random.uniform(0, field)) for i in range(count)]
+        projectiles = [(random.uniform(0, field), random.uniform(0, field)) for i in range(count)]
+        target_array = np.array(targets)
+        projectile_array = np.array(projectiles)
+        mouse = (field/2, field/2)
+
+        def scalar_click(i):
+            return [j for j, (x, y) in enumerate(targets) if get_distance(mouse[0], mouse[1], x, y) <= target_radius]
+
+        print_times(f"{count} click, scalar", time_frames(scalar_click, frames))
+        print_times(f"{count} click, numpy", time_frames(lambda i: np.nonzero(collision.circles_containing(mouse, target_array, target_radius)), frames))
+
+        if count <= 1000:
+            def scalar_pairs(i):
+                reach = target_radius+projectile_radius
+                return [(j, k) for j, (px, py) in enumerate(projectiles) for k, (tx, ty) in enumerate(targets) if get_distance(px, py, tx, ty) <= reach]
+
+            print_times(f"{count} pairs, scalar", time_frames(scalar_pairs, max(1, frames//10)))
+        else:
+            print(f"{f'{count} pairs, scalar':<32} skipped")
+
+        def hash_pairs(i):
+            #rebuilt every frame, as if everything had moved
+            spatial_hash = collision.SpatialHash(target_radius*2, target_array, target_radius)
+            return spatial_hash.query_circles(projectile_array, projectile_radius)
+
+        print_times(f"{count} pairs, spatial hash", time_frames(hash_pairs, frames))
+
+def bench_particles(counts=(1000, 10000, 50000), frames=300):
+    """
+    Per-frame cost of updating and drawing confetti onto a microgame sized surface,
+    done with a Python object per particle vs particles.py. The confetti is topped up so the count stays the same
+    """
+    import random
+    import particles
+
+    init_headless()
+    surf = pygame.Surface((300, 300))
+    pos = (150, 150)
+
+    for count in counts:
+        if count <= 10000:
+            objects = []
+            def object_frame(i):
+                while len(objects) < count:
+                    angle = random.uniform(math.pi*1.1, math.pi*1.9)
+                    speed = random.uniform(0.1, 0.45)
+                    objects.append([pos[0], pos[1], math.cos(angle)*speed, math.sin(angle)*speed, 0, random.uniform(800, 2000), random.choice(particles.CONFETTI_COLORS)])
+                surf.fill((0, 0, 0))
+                for particle in objects:
+                    particle[3] += 0.0005*16
+                    particle[0] += particle[2]*16
+                    particle[1] += particle[3]*16
+                    particle[4] += 16
+                    surf.fill(particle[6], (particle[0], particle[1], 2, 2))
+                objects[:] = [particle for particle in objects if particle[4] < particle[5]]
+
+            print_times(f"{count} particles, objects", time_frames(object_frame, frames))
+        else:
+            print(f"{f'{count} particles, objects':<32} skipped")
+
+        system = particles.ParticleSystem(capacity=count)
+        def frame(i):
+            particles.confetti(system, pos, count-len(system))
+            system.update(16)
+            surf.fill((0, 0, 0))
+            system.draw(surf)
+
+        print_times(f"{count} particles, numpy", time_frames(frame, frames))
+
+BENCHMARKS = {
+    "text_boxes":bench_text_boxes,
+    "timer_text":bench_timer_text,
+    "gallery":bench_gallery,
+    "timers":bench_timers,
+    "scaling":bench_scaling,
+    "rotations":bench_rotations,
+    "buttons":bench_buttons,
+    "sprites":bench_sprites,
+    "collision":bench_collision,
+    "particles":bench_particles,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name in BENCHMARKS:
+        subparsers.add_parser(name)
+
+    game_parser = subparsers.add_parser("game", help="run a microgame with scripted input")
+    game_parser.add_argument("game", nargs="?", default="test_game.TestGame", help="microgame class, like test_game.TestGame")
+    game_parser.add_argument("--frames", type=int, default=600)
+    game_parser.add_argument("--dt", type=int, default=16, help="milliseconds passed to update each frame")
+    game_parser.add_argument("--script", help="JSON input script, see load_script")
+    game_parser.add_argument("--output", help="file to write the results to")
+    game_parser.add_argument("--baseline", help="results file to compare against")
+    game_parser.add_argument("--tolerance", type=float, default=0.1, help="how much slower than the baseline is allowed (0.1 = 10%%)")
+    allocations_parser = subparsers.add_parser("draw_allocations", help="check main.draw leaves nothing allocated")
+    allocations_parser.add_argument("game", nargs="?", default="microgame.Microgame", help="microgame class, like test_game2.TestGame2")
+    args = parser.parse_args()
+
+    if args.benchmark == "draw_allocations":
+        sys.exit(0 if check_draw_allocations(args.game) else 1)
+    elif args.benchmark == "game":
+        passed = bench_game(args.game, args.frames, args.dt, args.script, output=args.output, baseline=args.baseline, tolerance=args.tolerance)
+        sys.exit(0 if passed else 1)
+    else:
+        BENCHMARKS[args.benchmark]()
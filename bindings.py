@@ -0,0 +1,64 @@
+"""
+This is a file for values that controls can be bound to.
+Every source has a version number that goes up whenever its value changes,
+so a bound control only has to compare numbers each frame to know whether to re-render.
+"""
+import weakref
+
+#sources whose values come from a function, these are refreshed once per frame by invalidate()
+computed_sources = weakref.WeakSet()
+
+class Observable:
+    """
+    A value that keeps track of when it changes
+    """
+    def __init__(self, value=None):
+        self.value = value
+        self.version = 0
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        if value != self.value:
+            self.value = value
+            self.version += 1
+
+class Computed(Observable):
+    """
+    A value that is pulled from a function during the per-frame invalidation pass
+    """
+    def __init__(self, function):
+        super().__init__(function())
+        self.function = function
+
+        computed_sources.add(self)
+
+    def refresh(self):
+        self.set(self.function())
+
+def bind(source):
+    """
+    Get something a control can be bound to.
+    source can be an Observable, a function taking no arguments, or a value that never changes
+    """
+    if isinstance(source, Observable):
+        return source
+    elif callable(source):
+        return Computed(source)
+    else:
+        return Observable(source)
+
+def unbind(source):
+    """
+    Stop refreshing a source made by bind, for when whatever was bound to it is gone
+    """
+    if isinstance(source, Computed):
+        computed_sources.discard(source)
+
+def invalidate():
+    """
+    Refresh every computed source. This is called once per frame by main.run_frame, before the frame's updates
+    """
+    for source in list(computed_sources):
+        source.refresh()
@@ -0,0 +1,160 @@
+"""
+This is a file for hit tests on lots of things at once, using numpy arrays rather than looping in Python.
+Positions are in the same coordinates as Microgame.get_mouse_pos (relative to the top corner of the microgame box),
+so the mouse position can be passed straight in. Points and centres are (N, 2) arrays (or anything numpy can turn
+into one, like a list of (x, y) tuples), radii are (N,) arrays or a single number, and rects are (N, 4) arrays of
+x, y, width, height.
+For example, to find which targets were clicked:
+    hit = collision.circles_containing(self.get_mouse_pos(), self.target_centres, self.target_radius)
+For lots of things against lots of other things, use a SpatialHash so only nearby pairs get checked
+"""
+import math
+import numpy as np
+
+def as_points(points):
+    """
+    Get points as an (N, 2) float array. A single (x, y) becomes a (1, 2) array
+    """
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+def get_distances(point, points):
+    """
+    Get the distance from one point to each of points
+    """
+    offsets = as_points(points) - as_points(point)
+    return np.hypot(offsets[:, 0], offsets[:, 1])
+
+def circles_containing(point, centres, radii):
+    """
+    Get which circles a point is in (edges count), as a bool array
+    """
+    offsets = as_points(centres) - as_points(point)
+    return (offsets[:, 0]**2 + offsets[:, 1]**2) <= np.square(radii)
+
+def rects_containing(point, rects):
+    """
+    Get which rects a point is in, as a bool array. Like pygame.Rect.collidepoint, the right and bottom edges don't count
+    """
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    x, y = as_points(point)[0]
+    return (rects[:, 0] <= x) & (x < rects[:, 0]+rects[:, 2]) & (rects[:, 1] <= y) & (y < rects[:, 1]+rects[:, 3])
+
+def points_in_circle(points, centre, radius):
+    """
+    Get which points are in one circle (edges count), as a bool array
+    """
+    return circles_containing(centre, points, radius)
+
+def points_in_rect(points, rect):
+    """
+    Get which points are in one rect (anything with x, y, w, h, like a pygame.Rect), as a bool array
+    """
+    points = as_points(points)
+    x, y, w, h = rect
+    return (x <= points[:, 0]) & (points[:, 0] < x+w) & (y <= points[:, 1]) & (points[:, 1] < y+h)
+
+def circles_overlapping(centres_a, radii_a, centres_b, radii_b):
+    """
+    Check every circle in a against every circle in b, returning an (N, M) bool array.
+    This is N*M checks, so for big N and M use a SpatialHash instead
+    """
+    centres_a = as_points(centres_a)
+    centres_b = as_points(centres_b)
+    offsets = centres_a[:, np.newaxis, :] - centres_b[np.newaxis, :, :]
+    reach = np.add.outer(np.broadcast_to(radii_a, len(centres_a)), np.broadcast_to(radii_b, len(centres_b)))
+    return (offsets[..., 0]**2 + offsets[..., 1]**2) <= reach**2
+
+class SpatialHash:
+    """
+    Circles sorted into a grid of cells, so queries only check the circles in nearby cells.
+    It's built all at once from arrays, so make a new one (or call build) each frame things move.
+    cell_size works best at around the size of the biggest circle
+    """
+    def __init__(self, cell_size, centres=(), radii=0):
+        self.cell_size = cell_size
+        self.build(centres, radii)
+
+    def get_cells(self, points):
+        return np.floor(points / self.cell_size).astype(np.int64)
+
+    def get_keys(self, cells):
+        #pack both cell coordinates into one number, so cells can be sorted and searched
+        return (cells[:, 0] << 32) + cells[:, 1]
+
+    def build(self, centres, radii=0):
+        """
+        Put a new set of circles in the hash, replacing what was there
+        """
+        self.centres = as_points(centres)
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), len(self.centres))
+        self.max_radius = float(self.radii.max()) if len(self.radii) else 0.0
+
+        keys = self.get_keys(self.get_cells(self.centres))
+        #circle indices sorted by cell, and where each cell's circles start in that
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.centres)
+
+    def get_candidates(self, centres, radii):
+        """
+        Get (query index, circle index) arrays of the pairs that are near enough to maybe overlap
+        """
+        if not len(self.centres) or not len(centres):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        max_query_radius = float(np.max(radii)) if np.size(radii) else 0.0
+        reach = math.ceil((max_query_radius + self.max_radius) / self.cell_size)
+
+        #keys are linear in the cell coordinates, so the keys of neighbouring cells are the same keys plus a constant,
+        #and sorting the queries once keeps every search below in order (which is much faster than searching at random)
+        query_keys = self.get_keys(self.get_cells(centres))
+        query_order = np.argsort(query_keys)
+        sorted_query_keys = query_keys[query_order]
+
+        query_indices = []
+        circle_indices = []
+        for dx in range(-reach, reach+1):
+            for dy in range(-reach, reach+1):
+                keys = sorted_query_keys + ((dx << 32) + dy)
+                found = np.searchsorted(self.cell_keys, keys)
+                found[found == len(self.cell_keys)] = 0
+                hit = np.nonzero(self.cell_keys[found] == keys)[0]
+                if not len(hit):
+                    continue
+
+                #every circle in each found cell, paired with the query that found it
+                starts = self.cell_starts[found[hit]]
+                counts = self.cell_counts[found[hit]]
+                total = counts.sum()
+                run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+                positions = np.repeat(starts, counts) + (np.arange(total) - run_starts)
+
+                query_indices.append(np.repeat(query_order[hit], counts))
+                circle_indices.append(self.order[positions])
+
+        if not query_indices:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(query_indices), np.concatenate(circle_indices)
+
+    def query_circles(self, centres, radii=0):
+        """
+        Get (query index, circle index) arrays of every query circle that overlaps a circle in the hash
+        """
+        centres = as_points(centres)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), len(centres))
+        query_indices, circle_indices = self.get_candidates(centres, radii)
+
+        offsets = centres[query_indices] - self.centres[circle_indices]
+        reach = radii[query_indices] + self.radii[circle_indices]
+        overlapping = (offsets[:, 0]**2 + offsets[:, 1]**2) <= reach**2
+        return query_indices[overlapping], circle_indices[overlapping]
+
+    def query_point(self, point):
+        """
+        Get the indices of the circles a point is in
+        """
+        return self.query_circles(point)[1]
@@ -0,0 +1,108 @@
+"""
+This is a file for keeping track of controls.
+Controls are indexed by the states they are active in and by where they are on the screen,
+so finding the active controls or the controls under the cursor doesn't mean checking every control.
+"""
+
+class ControlManager:
+    """
+    Holds every control, in the order they were made.
+    The lists returned by this are replaced rather than changed when controls are added or removed,
+    so it's safe to add or remove controls while looping over them
+    """
+    def __init__(self, cell_size=64):
+        #every control, in the order they were made
+        self.controls = []
+        #control -> when it was added, for keeping things in order
+        self.order = {}
+        self.next_order = 0
+
+        #state -> controls active in that state
+        self.by_state = {}
+
+        #uniform grid over the screen, (column, row) -> controls overlapping that cell
+        self.cell_size = cell_size
+        self.cells = {}
+        #control -> the cells it is in
+        self.control_cells = {}
+
+    def __iter__(self):
+        return iter(self.controls)
+
+    def __len__(self):
+        return len(self.controls)
+
+    def __contains__(self, control):
+        return control in self.order
+
+    def get_cell_keys(self, rect):
+        """
+        Get the grid cells a rect overlaps
+        """
+        left = rect.left // self.cell_size
+        top = rect.top // self.cell_size
+        right = (rect.right-1) // self.cell_size
+        bottom = (rect.bottom-1) // self.cell_size
+        return [(column, row) for column in range(left, right+1) for row in range(top, bottom+1)]
+
+    def add_to_cells(self, control):
+        keys = self.get_cell_keys(control.rect)
+        for key in keys:
+            self.cells[key] = self.cells.get(key, []) + [control]
+        self.control_cells[control] = keys
+
+    def remove_from_cells(self, control):
+        for key in self.control_cells.pop(control):
+            cell = [other for other in self.cells[key] if other is not control]
+            if cell:
+                self.cells[key] = cell
+            else:
+                del self.cells[key]
+
+    def append(self, control):
+        """
+        Add a control
+        """
+        self.controls = self.controls + [control]
+        self.order[control] = self.next_order
+        self.next_order += 1
+
+        for state in control.active_states:
+            self.by_state[state] = self.by_state.get(state, []) + [control]
+
+        self.add_to_cells(control)
+
+    def remove(self, control):
+        """
+        Remove a control
+        """
+        self.controls = [other for other in self.controls if other is not control]
+        del self.order[control]
+
+        for state in control.active_states:
+            self.by_state[state] = [other for other in self.by_state[state] if other is not control]
+
+        self.remove_from_cells(control)
+
+    def move(self, control):
+        """
+        Update where a control is on the grid. Call this whenever a control's rect changes
+        """
+        if control in self.order:
+            self.remove_from_cells(control)
+            self.add_to_cells(control)
+
+    def get_active(self, state):
+        """
+        Get the controls that are active in a state
+        """
+        return self.by_state.get(state, ())
+
+    def get_at(self, pos, state):
+        """
+        Get the controls active in a state that are under a point, in the order they were made
+        """
+        key = (int(pos[0]) // self.cell_size, int(pos[1]) // self.cell_size)
+        found = [control for control in self.cells.get(key, ()) if state in control.active_states and control.rect.collidepoint(pos)]
+        found.sort(key=self.order.__getitem__)
+        return found
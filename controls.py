@@ -4,6 +4,12 @@ Please don't use these for your game (you can make your own, I believe in you!)
 """
 import global_values as g
 import pygame
+import bindings
+import asset_manager
+import thumbnails
+import recording
+import glyphs
+from theme import theme
 
 class Control:
     """
@@ -16,6 +22,8 @@ class Control:
         g.controls.append(self)
         self.deleted = False
 
+        self.mark_dirty()
+
     def get_active(self):
         """
         Check whether this control should be ative
@@ -25,10 +33,22 @@ class Control:
         else:
             return False
 
+    def mark_dirty(self, rect=None):
+        """
+        Mark part of the screen as needing to be redrawn because this control has changed.
+        By default this is the whole control
+        """
+        if rect is None:
+            rect = self.rect
+        g.dirty_rects.append(rect.copy())
+
     def click(self):
         return False
 
-    def update(self):
+    def update(self, frame_input):
+        """
+        Update the control, frame_input is this frame's input_state.InputSnapshot
+        """
         pass
 
     def draw(self):
@@ -38,6 +58,9 @@ class Control:
         if not self.deleted:
             self.deleted = True
             g.controls.remove(self)
+            g.events.unregister_owner(self)
+            g.timers.cancel_owner(self)
+            self.mark_dirty()
 
 class ScrollBar(Control):
     """
@@ -55,9 +78,15 @@ class ScrollBar(Control):
 
         self.handling = False
 
-    def update(self):
-        ml = pygame.mouse.get_pressed()[0]
-        mx, my = pygame.mouse.get_pos()
+        g.events.register(pygame.MOUSEWHEEL, self.scroll, owner=self)
+
+    def scroll(self, event):
+        if self.get_active():
+            self.scroll_value = min(max(self.scroll_value-(0.01*event.y), 0), 1.0)
+
+    def update(self, frame_input):
+        ml = frame_input.mouse_buttons[0]
+        mx, my = frame_input.mouse_pos
         if not self.handling:
             if ml and self.rect.collidepoint((mx, my)):
                 self.handling = True
@@ -69,8 +98,10 @@ class ScrollBar(Control):
             self.scroll_value = max(min((my-self.rect.y)/self.rect.h, 1.0),0.0)
 
         handle_y = (self.rect.h - self.handle_height)*self.scroll_value
-        self.handle_rect.centery = handle_y
-
+        if self.handle_rect.centery != int(handle_y):
+            self.mark_dirty(self.rect.union(self.handle_rect))
+            self.handle_rect.centery = handle_y
+            self.mark_dirty(self.rect.union(self.handle_rect))
 
     def draw(self):
         pygame.draw.rect(g.screen, self.bar_color, self.rect, border_radius=8)    
@@ -80,12 +111,20 @@ class Button(Control):
     """
     Class for all sorts of buttons
     """
-    def __init__(self, rect, unpressed_gfx, highlighted_gfx, pressed_gfx, active_states, function):
+    def __init__(self, rect, unpressed_gfx, highlighted_gfx, pressed_gfx, active_states, function, label=None, label_offset=None):
         super().__init__(rect, active_states)
         self.unpressed_gfx = unpressed_gfx
         self.highlighted_gfx = highlighted_gfx
         self.pressed_gfx = pressed_gfx
 
+        #(surface, offset) parts drawn over the gfx (see theme.Theme.get_label), so the gfx can be shared between buttons.
+        #Centred on the first part if label_offset isn't given
+        self.label = label
+        if label and label_offset is None:
+            label_width, label_height = label[0][0].get_size()
+            label_offset = ((rect.w/2)-(label_width/2), (rect.h/2)-(label_height/2))
+        self.label_offset = label_offset
+
         self.highlighted = False
         self.pressed = False
 
@@ -95,14 +134,16 @@ class Button(Control):
     def press(self):
         self.function()
 
-    def update(self):
-        mx, my = pygame.mouse.get_pos()
-        if self.rect.collidepoint((mx, my)):
+    def update(self, frame_input):
+        old_highlighted = self.highlighted
+        old_pressed = self.pressed
+
+        if self.rect.collidepoint(frame_input.mouse_pos):
             self.highlighted = True
         else:
             self.highlighted = False
 
-        ml = pygame.mouse.get_pressed()[0]
+        ml = frame_input.mouse_buttons[0]
         if ml:
             if self.highlighted:
                 self.pressed = True
@@ -111,6 +152,9 @@ class Button(Control):
         else:
             self.pressed = False
 
+        if self.highlighted != old_highlighted or self.pressed != old_pressed:
+            self.mark_dirty()
+
     def click(self):
         self.press()
         return True
@@ -125,54 +169,102 @@ class Button(Control):
             surf = self.unpressed_gfx
         g.screen.blit(surf, self.rect)
 
+        if self.label:
+            x = self.rect.x + self.label_offset[0]
+            y = self.rect.y + self.label_offset[1]
+            for part, (offset_x, offset_y) in self.label:
+                g.screen.blit(part, (x+offset_x, y+offset_y))
+
 class TextBox(Control):
     """
     Class for showing text.
-    The text can either be static or evaluated over time
+    The text can either be static or bound to a changing value, see bindings.bind.
+    Set use_glyphs for text that changes often (like timers), so it's drawn from a glyph atlas rather than rendered
+    every time it changes, see glyphs.py
     """
-    def __init__(self, pos, text, font, timer, color, do_eval_text, active_states, cx=True, cy=False):
-        self.pos = pos
+    def __init__(self, pos, text, font, timer, color, active_states, cx=True, cy=False, use_glyphs=False):
+        self._pos = pos
+        self.rect = pygame.Rect(pos[0], pos[1], 0, 0)
         self.font = font
         self.color = color
         #whether to center this control
         self.cx = cx
         self.cy = cy
 
-        self.do_eval_text = do_eval_text
-        if self.do_eval_text:
-            self.eval_text = ""
+        self.atlas = glyphs.get_atlas(font, color) if use_glyphs else None
 
-        self.text = text
-
-        if self.do_eval_text:
-            self.set_text(str(eval(self.text)))
-        else:
-            self.set_text(self.text)
+        #what we are showing, and the version of it we last rendered
+        self.source = bindings.bind(text)
+        self.version = None
+        self.text = None
+        self.refresh_text()
 
         if timer:
-            deletion_event = pygame.event.Event(g.TEXT_BOX_DELETE_EVENT, {"control":self})
-            pygame.time.set_timer(deletion_event, timer*1000, loops=1)
+            g.timers.add(timer*1000, self.delete, owner=self)
 
-        super().__init__(pygame.Rect(pos[0], pos[1], 1, 1), active_states)
+        super().__init__(self.rect, active_states)
 
-    def update(self):
-        if self.do_eval_text:
-            old_text = self.eval_text
-            self.eval_text = str(eval(self.text))
+    @property
+    def pos(self):
+        return self._pos
 
-            if old_text != self.eval_text:
-                self.set_text(self.eval_text)
+    @pos.setter
+    def pos(self, pos):
+        self._pos = pos
+        self.update_rect()
+
+    def update_rect(self):
+        """
+        Work out the area the text (and its shadow) is drawn in, marking it as needing a redraw if it moved
+        """
+        x, y = self._pos
+        width, height = self.text_size
+        if self.cx:
+            x -= width/2
+        if self.cy:
+            y -= height/2
+
+        shadow_offset = 2
+        rect = pygame.Rect(x, y, width+shadow_offset, height+shadow_offset)
+        if rect != self.rect:
+            self.mark_dirty()
+            self.rect = rect
+            self.mark_dirty()
+            g.controls.move(self)
+
+    def refresh_text(self):
+        """
+        Re-render the text if the value it is bound to has changed
+        """
+        if self.source.version != self.version:
+            self.version = self.source.version
+            self.text = str(self.source.get())
+            self.set_text(self.text)
+
+    def update(self, frame_input):
+        self.refresh_text()
+
+    def delete(self):
+        #stop polling whatever we were bound to, even if something still holds on to us
+        bindings.unbind(self.source)
+        super().delete()
 
     def set_text(self, text):
-        self.rendered_text = self.font.render(text, True, self.color)
-        self.rendered_shadow_text = self.font.render(text, True, "black")
+        if self.atlas:
+            self.text_size = self.atlas.get_size(text)
+        else:
+            self.rendered_text = self.font.render(text, True, self.color)
+            self.rendered_shadow_text = self.font.render(text, True, "black")
+            self.text_size = self.rendered_text.get_size()
+        self.update_rect()
+        self.mark_dirty()
 
     def draw(self):
-        x, y = self.pos
-        if self.cx:
-            x -= self.rendered_text.get_width()/2
-        if self.cy:
-            y -= self.rendered_text.get_height()/2
+        x, y = self.rect.topleft
+
+        if self.atlas:
+            self.atlas.draw(g.screen, self.text, (x, y))
+            return
 
         shadow_x = x + 2
         shadow_y = y + 2
@@ -184,140 +276,176 @@ class TextBox(Control):
         
 def create_button(rect, text, font, function, color, background_color, active_states, border_width=32, border_radius=32):
     """
-    Create a button from set parameters. Convinience function
+    Create a button from set parameters. Convinience function.
+    The frames come from the shared theme, so buttons of the same size and style don't draw anything new
     """
-    #create normal surf
-    button_text = font.render(text, True, "black")
-    button_shadow_text = font.render(text, True, "black")
-    button_shadow_text.set_alpha(128)
-
-    button_surf = pygame.Surface((rect.w, rect.h), pygame.SRCALPHA)
-    button_surf.fill((0,0,0,0))
-
-    pygame.draw.rect(button_surf, background_color, pygame.Rect(0,0,rect.w,rect.h), border_radius=border_radius)
-    border_rect = pygame.Rect(0,0,rect.w,rect.h)
-    border_rect.center = (rect.w/2, rect.h/2)
-    pygame.draw.rect(button_surf, "gray", border_rect, width=border_width, border_radius=border_radius)
+    frames = theme.get_frames(rect.size, background_color, "gray", border_width, border_radius)
+    label = theme.get_label(font, text, "black")
+    return Button(rect, *frames, active_states, function, label=label)
 
-    text_width, text_height = button_text.get_size()
-    button_surf.blit(button_text, ( (rect.w/2)-(text_width/2) , (rect.h/2)-(text_height/2) ))
-    shadow_x = 1
-    shadow_y = 1
-    button_surf.blit(button_shadow_text, ( (rect.w/2)-(text_width/2)+shadow_x , (rect.h/2)-(text_height/2)+shadow_y ))
-
-    #darkening effect (for highlighting and pressing)
-    darkening_surf = pygame.Surface((rect.w, rect.h))
-    darkening_surf.fill((64,64,64))
-
-    #create highlight surf
-    button_highlight_surf = button_surf.copy()
-    button_highlight_surf.blit(darkening_surf, (0,0), special_flags=pygame.BLEND_SUB)
-
-    #create press surf
-    button_pressed_surf = button_surf.copy()
-    button_pressed_surf.blit(darkening_surf, (0,0), special_flags=pygame.BLEND_SUB)
-    button_pressed_surf.blit(darkening_surf, (0,0), special_flags=pygame.BLEND_SUB)
-
-    return Button(rect, button_surf, button_highlight_surf, button_pressed_surf, active_states, function)
 
 
+def run_game(game_class):
+    """
+    Make and run a new microgame
+    """
+    game = game_class()
+    recording.begin(game)
+    game.run()
 
 class Gallery(Control):
     """
-    Control for showing a gallery of microgames
+    Control for showing a gallery of microgames.
+    Thumbnails are laid out in a grid, and only the rows that are visible are looked at each frame
     """
-    def __init__(self, rect, game_classes, active_states):
+    def __init__(self, rect, games, active_states):
         super().__init__(rect, active_states)
 
-        self.game_classes = game_classes
+        #the games to show, as registry.GameEntry
+        self.games = games
 
         self.thumbnail_width = 64
         self.thumbnail_height = 64
 
+        #gap between thumbnails
+        self.sep_width = 10
+        self.sep_height = 10
+
+        #distance from one thumbnail to the next
+        self.pitch_x = self.thumbnail_width+self.sep_width
+        self.pitch_y = self.thumbnail_height+self.sep_height
+
+        self.columns = max( ((self.rect.w-(self.sep_width*2)-self.thumbnail_width) // self.pitch_x) + 1, 1)
+        self.rows = -(-len(self.games) // self.columns)
+
+        #the part of the gallery that is on screen
+        self.view_rect = self.rect.clip(pygame.Rect(0, 0, g.WIDTH, g.HEIGHT))
+
         self.scroll = 0
-        self.max_scroll = 0
+        content_height = (self.rows*self.pitch_y) + self.sep_height
+        self.max_scroll = max(content_height-self.view_rect.h, 0)
 
         self.selected_index = None
         self.pressed = False
 
-        self.thumbnails = []
-        for game_class in game_classes:
-            game = game_class()
-            thumbnail = pygame.transform.scale(game.metadata["thumbnail"], (self.thumbnail_width, self.thumbnail_height) )
-        
-            self.thumbnails.append(thumbnail)
-
-        self.thumbnail_rects = []
+        #thumbnails are only made once they scroll into view, and are cached between launches
+        self.atlas = thumbnails.get_atlas(self.thumbnail_width, self.thumbnail_height)
+        #how many missing thumbnails we can make in a single frame
+        self.thumbnails_per_frame = 4
+        #whether any visible thumbnails still need making
+        self.thumbnails_missing = False
 
         rect = pygame.Rect(self.rect.right-16, 0, 16, self.rect.h)
         self.scrollbar = ScrollBar(rect, "red", "blue", self.active_states, handle_height=16)
 
-    def update(self):
-        mx, my = pygame.mouse.get_pos()
-        ml, mm, mr = pygame.mouse.get_pressed()
-        i = 0
+    def get_index_at(self, pos):
+        """
+        Get the index of the thumbnail at a point on the screen, or None if there isn't one
+        """
+        x, y = pos
+        if not self.view_rect.collidepoint((x, y)):
+            return None
+
+        local_x = x - self.rect.x - self.sep_width
+        local_y = y - self.rect.y - self.sep_height + self.scroll
+        if local_x < 0 or local_y < 0:
+            return None
+
+        column = int(local_x // self.pitch_x)
+        row = int(local_y // self.pitch_y)
+        #in the gap between thumbnails
+        if local_x - (column*self.pitch_x) >= self.thumbnail_width or local_y - (row*self.pitch_y) >= self.thumbnail_height:
+            return None
+        if column >= self.columns:
+            return None
+
+        index = (row*self.columns) + column
+        if index >= len(self.games):
+            return None
+        return index
+
+    def get_visible_rows(self):
+        """
+        Get the range of rows that are at least partly on screen
+        """
+        first = int( (self.scroll-self.sep_height) // self.pitch_y )
+        last = int( (self.scroll+self.view_rect.h-self.sep_height) // self.pitch_y )
+        return range(max(first, 0), min(last+1, self.rows))
 
-        #check for click
-        self.selected_index = None
-        for rect in self.thumbnail_rects:
-            if rect.collidepoint((mx, my)):
-                self.selected_index = i
+    def get_thumbnail_rect(self, index):
+        """
+        Get where a thumbnail is on the screen
+        """
+        row, column = divmod(index, self.columns)
+        x = self.rect.x + self.sep_width + (column*self.pitch_x)
+        y = self.rect.y + self.sep_height + (row*self.pitch_y) - self.scroll
+        return pygame.Rect(x, y, self.thumbnail_width, self.thumbnail_height)
+
+    def update(self, frame_input):
+        old_selected_index = self.selected_index
+        old_pressed = self.pressed
+        old_scroll = self.scroll
 
-                break
-            i += 1
+        ml, mm, mr = frame_input.mouse_buttons
+
+        self.scroll = self.scrollbar.scroll_value*self.max_scroll
+
+        #check for click
+        self.selected_index = self.get_index_at(frame_input.mouse_pos)
 
         if ml:
             self.pressed = True
         else:
             self.pressed = False
 
-        self.scroll = self.scrollbar.scroll_value*self.max_scroll
+        if self.thumbnails_missing or self.selected_index != old_selected_index or self.pressed != old_pressed or self.scroll != old_scroll:
+            self.mark_dirty()
+
+        self.atlas.save_if_due()
 
     def click(self):
         if self.pressed and self.selected_index is not None:
             g.state = "main_menu"
-            
-            game_event = pygame.event.Event(g.RUN_GAME_EVENT, {"game":self.game_classes[self.selected_index]})
-            pygame.time.set_timer(game_event, 1000, loops=1)
+
+            #start loading the game's assets while we wait for it to run
+            game_class = self.games[self.selected_index].load()
+            asset_manager.manager.preload(game_class.asset_paths)
+
+            g.timers.add(1000, run_game, game_class)
+            #the gallery won't be updated while the game runs, so save what it made now
+            self.atlas.save()
             return True
         else:
             return False
 
     def draw(self):
-        self.thumbnail_rects = []
-
-        sep_width = 10
-        sep_height = 10
-
-        thumbnail_rect = pygame.Rect(sep_width, sep_height-self.scroll+self.rect.y, self.thumbnail_width, self.thumbnail_height)
-
-        i = 0
-        for thumbnail in self.thumbnails:
-            if self.rect.colliderect(thumbnail_rect):
-                #crop and draw thumbnail
-                if not thumbnail_rect in self.rect:
-                    thumbnail_crop_rect = thumbnail_rect.clip(self.rect)
-                    thumbnail_crop_rect.x = 0
-                    thumbnail_crop_rect.y = thumbnail_rect.height-thumbnail_crop_rect.height
-                    
-                    g.screen.blit(thumbnail, thumbnail_rect.move(0,thumbnail_rect.height-thumbnail_crop_rect.height), thumbnail_crop_rect)
-                else:
-                    g.screen.blit(thumbnail, thumbnail_rect)
-
-            self.thumbnail_rects.append(thumbnail_rect.copy())
-
-            if i is self.selected_index:
-                if self.pressed:
-                    color = "green"
+        thumbnails_made = 0
+        self.thumbnails_missing = False
+
+        for row in self.get_visible_rows():
+            first_index = row*self.columns
+            for index in range(first_index, min(first_index+self.columns, len(self.games))):
+                game = self.games[index]
+                thumbnail_rect = self.get_thumbnail_rect(index)
+                visible_rect = thumbnail_rect.clip(self.view_rect)
+
+                area = self.atlas.get(game, create=False)
+                if area is None and thumbnails_made < self.thumbnails_per_frame:
+                    area = self.atlas.get(game)
+                    thumbnails_made += 1
+
+                if area is None:
+                    #not made yet, show a placeholder
+                    self.thumbnails_missing = True
+                    pygame.draw.rect(g.screen, "gray", visible_rect, 1)
                 else:
-                    color = "white"
-                pygame.draw.rect(g.screen, color, thumbnail_rect, 2)
-
-            thumbnail_rect.x += self.thumbnail_width+sep_width
-            if thumbnail_rect.right > self.rect.right-sep_width:
-                thumbnail_rect.x = sep_width
-                thumbnail_rect.y += self.thumbnail_height+sep_height
-
-            i += 1
-
-        self.max_scroll = thumbnail_rect.bottom
\ No newline at end of file
+                    #crop thumbnails at the edge of the gallery
+                    area = pygame.Rect(area.x+visible_rect.x-thumbnail_rect.x, area.y+visible_rect.y-thumbnail_rect.y, visible_rect.w, visible_rect.h)
+                    g.screen.blit(self.atlas.surf, visible_rect, area)
+
+                if index == self.selected_index:
+                    if self.pressed:
+                        color = "green"
+                    else:
+                        color = "white"
+                    pygame.draw.rect(g.screen, color, thumbnail_rect, 2)
@@ -0,0 +1,155 @@
+"""
+This is a file for the window, and scaling what's drawn up to fit it.
+Everything draws to g.screen, which is always WIDTH x HEIGHT. With a scale mode on, g.screen is an offscreen surface
+that is scaled into a part of the window made once when the window is opened, so scaling doesn't allocate anything.
+Mouse positions are mapped back from the window to g.screen before anything sees them
+"""
+import pygame
+import global_values as g
+
+#events with positions that need mapping back to g.screen
+MOUSE_EVENT_TYPES = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+class Display:
+    """
+    The window, and where g.screen goes on it
+    """
+    def __init__(self):
+        #None (draw straight to the window), "integer" (scale by a whole number) or "fit" (scale to fill the window)
+        self.mode = None
+        self.window = None
+
+        #where g.screen is drawn on the window, and the part of the window it is scaled into
+        self.rect = pygame.Rect(0, 0, g.WIDTH, g.HEIGHT)
+        self.target = None
+        #self.rect's size, kept so getting it doesn't make a new tuple every frame
+        self.size = self.rect.size
+        #the whole number g.screen is scaled up by, or 0 if it's scaled by a fraction
+        self.integer_scale = 1
+
+        #the part of g.screen that changed and the part of the window being updated, the same rects every frame
+        self.source_rect = pygame.Rect(0, 0, 0, 0)
+        self.window_rect = pygame.Rect(0, 0, 0, 0)
+
+    def get_scale(self, window_size):
+        """
+        Get how much g.screen is scaled by to fit in the window. In "integer" mode this is a whole number, unless the
+        window is too small for g.screen, then it's scaled down to fit like in "fit" mode
+        """
+        scale = min(window_size[0]/g.WIDTH, window_size[1]/g.HEIGHT)
+        if self.mode == "integer" and scale >= 1:
+            return int(scale)
+        return scale
+
+    def open(self, mode=None, window_size=None, fullscreen=False):
+        """
+        Open the window and set g.screen. If window_size isn't given, it's the size of the desktop when scaling
+        """
+        if mode not in (None, "integer", "fit"):
+            raise ValueError(f"unknown scale mode {mode!r}")
+        if mode is None and window_size and (window_size[0] < g.WIDTH or window_size[1] < g.HEIGHT):
+            #too small to draw g.screen unscaled
+            mode = "fit"
+        self.mode = mode
+
+        flags = pygame.FULLSCREEN if fullscreen else 0
+        if mode is None:
+            self.window = pygame.display.set_mode(window_size or (g.WIDTH, g.HEIGHT), flags)
+            self.rect = pygame.Rect(0, 0, g.WIDTH, g.HEIGHT)
+            self.rect.center = self.window.get_rect().center
+            if self.window.get_size() == (g.WIDTH, g.HEIGHT):
+                g.screen = self.window
+                self.target = None
+            else:
+                #a bigger window, with the screen drawn unscaled in the middle
+                g.screen = pygame.Surface((g.WIDTH, g.HEIGHT), 0, self.window)
+                self.target = self.window.subsurface(self.rect)
+            self.integer_scale = 1
+
+        else:
+            if window_size is None:
+                window_size = pygame.display.get_desktop_sizes()[0]
+            self.window = pygame.display.set_mode(window_size, flags)
+            scale = self.get_scale(window_size)
+            self.integer_scale = scale if isinstance(scale, int) else 0
+            self.rect = pygame.Rect(0, 0, int(g.WIDTH*scale), int(g.HEIGHT*scale))
+            self.rect.center = self.window.get_rect().center
+            g.screen = pygame.Surface((g.WIDTH, g.HEIGHT), 0, self.window)
+            self.target = self.window.subsurface(self.rect)
+
+        self.size = self.rect.size
+        self.window.fill((0,0,0))
+        g.full_redraw = True
+        return g.screen
+
+    def to_screen(self, pos):
+        """
+        Map a position on the window to one on g.screen
+        """
+        if self.target is None:
+            return pos
+        x = (pos[0]-self.rect.x)*g.WIDTH//self.rect.w
+        y = (pos[1]-self.rect.y)*g.HEIGHT//self.rect.h
+        return x, y
+
+    def map_events(self, events):
+        """
+        Change the positions of mouse events from the window to g.screen
+        """
+        if self.target is None:
+            return
+        for event in events:
+            if event.type in MOUSE_EVENT_TYPES:
+                event.pos = self.to_screen(event.pos)
+                if event.type == pygame.MOUSEMOTION:
+                    event.rel = (event.rel[0]*g.WIDTH//self.rect.w, event.rel[1]*g.HEIGHT//self.rect.h)
+
+    def clip_to_screen(self, rect):
+        """
+        Set self.source_rect to the part of rect that is on g.screen
+        """
+        left = max(rect.left, 0)
+        top = max(rect.top, 0)
+        right = min(rect.right, g.WIDTH)
+        bottom = min(rect.bottom, g.HEIGHT)
+        self.source_rect.update(left, top, max(right-left, 0), max(bottom-top, 0))
+
+    def present(self, full_redraw, dirty_rect):
+        """
+        Show what has been drawn to g.screen. If it's not a full redraw, only dirty_rect has changed
+        """
+        if self.target is None:
+            if full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty_rect)
+            return
+
+        scale = self.integer_scale
+        if full_redraw:
+            self.source_rect.update(0, 0, g.WIDTH, g.HEIGHT)
+        else:
+            self.clip_to_screen(dirty_rect)
+
+        if scale == 1:
+            #no scaling, just copy across what changed
+            self.target.blit(g.screen, self.source_rect, self.source_rect)
+        else:
+            #scaling only part of the screen would need new surfaces for that part every frame,
+            #so all of it is scaled into the part of the window made when it was opened
+            pygame.transform.scale(g.screen, self.size, self.target)
+
+        if full_redraw or not scale:
+            #scaling by a fraction smears changes into the pixels around them, so all of it is updated
+            self.window_rect.update(self.rect)
+        else:
+            source_rect = self.source_rect
+            self.window_rect.update(self.rect.x + source_rect.x*scale, self.rect.y + source_rect.y*scale, source_rect.w*scale, source_rect.h*scale)
+
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.window_rect)
+
+#the display main.py uses
+display = Display()
@@ -0,0 +1,97 @@
+"""
+This is a file for sending events to whatever handles them.
+Handlers are registered by event type, so each event only goes to the handlers for its type,
+and SDL is told to only queue the types something has registered for, so the rest are dropped at the source
+"""
+import pygame
+
+class EventDispatcher:
+    """
+    A table of event type -> handlers.
+    The lists of handlers are replaced rather than changed when handlers are added or removed,
+    so it's safe for a handler to register or unregister handlers
+    """
+    def __init__(self):
+        #event type -> list of (handler, owner)
+        self.handlers = {}
+        #owner -> event types it has handlers for
+        self.owners = {}
+        #event types to let through even though nothing handles them, e.g. for input_state
+        self.allowed = set()
+
+        #whether the event types SDL should queue have changed since the filter was last set
+        self.filter_changed = True
+        #the event types SDL was last told to queue, None if it hasn't been told yet
+        self.filtered_types = None
+
+    def register(self, event_type, handler, owner=None):
+        """
+        Call handler(event) for every event of this type.
+        If an owner is given, the handler can be removed along with the owner's other handlers
+        """
+        handlers = self.handlers.get(event_type, [])
+        if not handlers and event_type not in self.allowed:
+            self.filter_changed = True
+        self.handlers[event_type] = handlers + [(handler, owner)]
+
+        if owner is not None:
+            self.owners.setdefault(owner, set()).add(event_type)
+
+    def unregister_owner(self, owner):
+        """
+        Remove every handler belonging to an owner
+        """
+        for event_type in self.owners.pop(owner, ()):
+            handlers = [entry for entry in self.handlers[event_type] if entry[1] is not owner]
+            if handlers:
+                self.handlers[event_type] = handlers
+            else:
+                del self.handlers[event_type]
+                if event_type not in self.allowed:
+                    self.filter_changed = True
+
+    def allow(self, *event_types):
+        """
+        Let events of these types be queued even if nothing handles them
+        """
+        for event_type in event_types:
+            if event_type not in self.allowed and event_type not in self.handlers:
+                self.filter_changed = True
+            self.allowed.add(event_type)
+
+    def get_event_types(self):
+        return self.allowed.union(self.handlers)
+
+    def update_filter(self):
+        """
+        Tell SDL to only queue the event types that are handled or allowed, if they've changed.
+        SDL throws away queued events of a type when it's blocked, so call this just after getting the events
+        """
+        if not self.filter_changed:
+            return
+
+        event_types = self.get_event_types()
+        if self.filtered_types is None:
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(list(event_types))
+        else:
+            #only change the types that need changing
+            blocked = self.filtered_types - event_types
+            if blocked:
+                pygame.event.set_blocked(list(blocked))
+            allowed = event_types - self.filtered_types
+            if allowed:
+                pygame.event.set_allowed(list(allowed))
+
+        self.filtered_types = event_types
+        self.filter_changed = False
+
+    def dispatch(self, events):
+        """
+        Send each event to the handlers for its type
+        """
+        for event in events:
+            handlers = self.handlers.get(event.type)
+            if handlers:
+                for handler, owner in handlers:
+                    handler(event)
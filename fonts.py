@@ -0,0 +1,109 @@
+"""
+This is a file for sharing fonts between controls and microgames.
+Use fonts.get_font instead of pygame.font.SysFont, so each font is only looked up and loaded once
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+import pygame
+import global_values as g
+
+class FontRegistry:
+    """
+    Loaded fonts keyed by (name, size, bold, italic).
+    The least recently used fonts are dropped once there are too many.
+    The paths that font names resolve to are kept on disk, so we don't have to scan the system fonts on startup.
+    This can be used from worker threads, e.g. when runner mode builds the next microgame
+    """
+    def __init__(self, max_fonts=32):
+        self.max_fonts = max_fonts
+        self.fonts = OrderedDict()
+        self.lock = threading.Lock()
+
+        #"name|bold|italic" -> font file path (or None if the system doesn't have it)
+        self.paths = None
+        self.paths_dirty = False
+        self.index_path = os.path.join(g.CACHE_DIR, "fonts.json")
+
+    def load_paths(self):
+        """
+        Load the resolved font paths from disk
+        """
+        self.paths = {}
+        try:
+            with open(self.index_path) as f:
+                self.paths = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save_paths(self):
+        """
+        Save the resolved font paths to disk if they have changed
+        """
+        if not self.paths_dirty:
+            return
+
+        os.makedirs(g.CACHE_DIR, exist_ok=True)
+        with open(self.index_path, "w") as f:
+            json.dump(self.paths, f)
+
+        self.paths_dirty = False
+
+    def get_path(self, name, bold, italic):
+        """
+        Get the file for a system font, only scanning the system fonts if we haven't seen it before
+        """
+        if self.paths is None:
+            self.load_paths()
+
+        key = f"{name}|{int(bold)}|{int(italic)}"
+        path = self.paths.get(key, "")
+        if path is None or (path and os.path.exists(path)):
+            return path
+
+        path = pygame.font.match_font(name, bold, italic)
+        self.paths[key] = path
+        self.paths_dirty = True
+        self.save_paths()
+
+        return path
+
+    def get_font(self, name, size, bold=False, italic=False):
+        """
+        Get a font, loading it if it isn't already loaded
+        """
+        with self.lock:
+            return self.load_font(name, size, bold, italic)
+
+    def load_font(self, name, size, bold, italic):
+        key = (name, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.fonts.move_to_end(key)
+            return font
+
+        if not pygame.font.get_init():
+            pygame.font.init()
+
+        path = self.get_path(name, bold, italic)
+        font = pygame.font.Font(path, size)
+        #fall back to faking the style like SysFont does
+        if path is None:
+            font.set_bold(bold)
+            font.set_italic(italic)
+
+        self.fonts[key] = font
+        if len(self.fonts) > self.max_fonts:
+            self.fonts.popitem(last=False)
+
+        return font
+
+#the registry everything shares
+registry = FontRegistry()
+
+def get_font(name, size, bold=False, italic=False):
+    """
+    Get a font from the shared registry. Use this instead of pygame.font.SysFont
+    """
+    return registry.get_font(name, size, bold, italic)
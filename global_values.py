@@ -3,6 +3,10 @@ This is a file for constants and global state.
 You probably dont' need to look at this
 """
 import pygame
+import control_manager
+from timers import TimerScheduler
+from input_state import InputSnapshot
+from event_dispatch import EventDispatcher
 
 #the current microgame being run
 current_game = None
@@ -13,18 +17,74 @@ screen = None
 #what part of the game we are at
 state = "main_menu"
 
-#list of controls (buttons, etc)
-controls = []
+#all the controls (buttons, etc), see control_manager.ControlManager
+controls = control_manager.ControlManager()
 
-#list of timers
-timers = []
+#timers running on the game clock, see timers.TimerScheduler
+timers = TimerScheduler()
+
+#event type -> handlers, see event_dispatch.EventDispatcher
+events = EventDispatcher()
+
+#the mouse and keyboard this frame, see input_state.InputSnapshot
+frame_input = InputSnapshot()
+
+#parts of the screen that need redrawing this frame
+dirty_rects = []
+
+#whether the whole screen needs redrawing this frame
+full_redraw = True
+
+#the state and microgame the screen was last drawn with, if these change everything is redrawn
+drawn_state = None
+drawn_game = None
+
+#the area of the screen being redrawn this frame
+clip_rect = pygame.Rect(0, 0, 0, 0)
+
+#time (ms) that hasn't been given to a fixed timestep update yet
+update_accumulator = 0
+
+#how far we are between the last fixed timestep update and the next one (0 to 1).
+#Use this in draw if you want to smooth out movement between updates, see Microgame.draw
+frame_alpha = 0
+
+#whether the last frame was idle (see main.run_frame)
+idle = False
 
-MICROGAME_TIMEOUT_EVENT = pygame.event.custom_type()
 MICROGAME_END_EVENT = pygame.event.custom_type()
-TEXT_BOX_DELETE_EVENT = pygame.event.custom_type()
-RUN_GAME_EVENT = pygame.event.custom_type()
 
 #CONSTANTS
 WIDTH = 500
 HEIGHT = 500
 
+#scaling the screen up to fit the window. None to draw straight to a WIDTH x HEIGHT window,
+#"integer" to scale by the biggest whole number that fits, or "fit" to fill as much of the window as possible.
+#Windows smaller than WIDTH x HEIGHT are always scaled down to fit
+SCALE_MODE = None
+WINDOW_SIZE = None #size of the window when scaling, None for the size of the desktop
+FULLSCREEN = False
+
+#only redraw the parts of the screen that have changed, rather than the whole screen every frame
+DIRTY_RECTS = True
+
+#frame pacing
+FPS = 60 #most frames per second to draw, 0 for no limit
+IDLE_FPS = 10 #frames per second when nothing is happening (no microgame, no input, nothing to redraw, no timers waiting)
+FIXED_TIMESTEP = True #call update with the same dt every time, rather than once per frame with however long the frame took
+UPDATE_RATE = 120 #updates per second with a fixed timestep
+MAX_FRAME_TIME = 250 #most time (ms) a single frame can catch up on, so one slow frame doesn't cause more
+
+#where to keep things that are cached between launches
+CACHE_DIR = "cache"
+
+#where to look for microgames
+GAMES_DIR = "."
+
+#most memory (bytes) loaded microgames can use before idle ones are unloaded, see resources.py. None for no limit
+MEMORY_BUDGET = 64*1024*1024
+
+#record the input and timing of every microgame that is played, so it can be replayed with recording.py
+RECORD_INPUT = False
+RECORDINGS_DIR = "recordings"
+
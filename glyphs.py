@@ -0,0 +1,97 @@
+"""
+This is a file for drawing text that changes often, like timers and scores.
+Each character is rendered once (with its shadow) into an atlas per font and colour, and strings are drawn by
+blitting characters out of the atlas in one Surface.blits call, so changing the text doesn't render anything.
+Characters are drawn one at a time, so there's no kerning
+"""
+import weakref
+import pygame
+
+#characters every atlas starts with, others are added when they're first drawn
+DEFAULT_CHARACTERS = "".join(chr(code) for code in range(32, 127))
+
+#font -> {(color, shadow color): atlas}. Atlases go when their font does
+atlases = weakref.WeakKeyDictionary()
+
+def get_atlas(font, color, shadow_color=(0,0,0)):
+    """
+    Get the shared atlas for a font and colour, making it if needed
+    """
+    font_atlases = atlases.setdefault(font, {})
+    key = (pygame.Color(color).normalize(), None if shadow_color is None else pygame.Color(shadow_color).normalize())
+    atlas = font_atlases.get(key)
+    if atlas is None:
+        atlas = GlyphAtlas(font, color, shadow_color)
+        font_atlases[key] = atlas
+    return atlas
+
+class GlyphAtlas:
+    """
+    Every character of one font in one colour, side by side on one surface.
+    Digits are all given the width of the widest one, so numbers that count down don't jiggle about
+    """
+    def __init__(self, font, color, shadow_color=(0,0,0), shadow_offset=2, characters=DEFAULT_CHARACTERS):
+        #weak so the atlas doesn't keep its own font alive in atlases
+        self.font_ref = weakref.ref(font)
+        self.color = color
+        self.shadow_color = shadow_color
+        self.shadow_offset = shadow_offset if shadow_color is not None else 0
+
+        self.height = font.get_height()
+        self.digit_width = max(font.size(digit)[0] for digit in "0123456789")
+        #character -> area of self.surf, covering the character and its shadow
+        self.areas = {}
+        #character -> how far along to move after drawing it
+        self.advances = {}
+        self.surf = None
+        self.add_characters(characters)
+
+    def add_characters(self, characters):
+        """
+        Render characters into the atlas. The whole atlas is made again, so do this as rarely as possible
+        """
+        font = self.font_ref()
+        characters = "".join(dict.fromkeys(list(self.areas) + list(characters)))
+        for character in characters:
+            self.advances[character] = self.digit_width if character.isdigit() else font.size(character)[0]
+
+        cell_height = self.height+self.shadow_offset
+        self.surf = pygame.Surface((sum(self.advances.values()) + (self.shadow_offset*len(characters)), cell_height), pygame.SRCALPHA)
+        self.areas = {}
+        x = 0
+        for character in characters:
+            if self.shadow_color is not None:
+                self.surf.blit(font.render(character, True, self.shadow_color), (x+self.shadow_offset, self.shadow_offset))
+            self.surf.blit(font.render(character, True, self.color), (x, 0))
+
+            cell_width = self.advances[character]+self.shadow_offset
+            self.areas[character] = pygame.Rect(x, 0, cell_width, cell_height)
+            x += cell_width
+
+    def get_size(self, text):
+        """
+        Get the size of some text when drawn, not counting the shadow
+        """
+        self.add_missing(text)
+        return sum(self.advances[character] for character in text), self.height
+
+    def add_missing(self, text):
+        missing = [character for character in text if character not in self.areas]
+        if missing:
+            self.add_characters(missing)
+
+    def draw(self, surf, text, pos):
+        """
+        Draw text onto a surface with its top left corner at pos
+        """
+        self.add_missing(text)
+
+        x, y = pos
+        atlas = self.surf
+        areas = self.areas
+        advances = self.advances
+        sequence = []
+        for character in text:
+            sequence.append((atlas, (x, y), areas[character]))
+            x += advances[character]
+        surf.blits(sequence, doreturn=False)
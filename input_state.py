@@ -0,0 +1,139 @@
+"""
+This is a file for the input snapshot that is taken once per frame.
+Rather than every control and microgame asking SDL where the mouse is, main.handle_input builds one snapshot
+from the frame's events, and everything reads that. Since it only depends on the events, feeding in the same events
+gives the same input
+"""
+from typing import NamedTuple
+import pygame
+
+#the event types snapshots are built from
+EVENT_TYPES = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.KEYDOWN, pygame.KEYUP, pygame.WINDOWFOCUSLOST)
+
+class InputSnapshot(NamedTuple):
+    """
+    The state of the mouse and keyboard for one frame. Don't change these, a new one is made every frame
+    """
+    #mouse position on the screen, and relative to the top corner of the current microgame's box
+    mouse_pos: tuple = (0, 0)
+    local_mouse_pos: tuple = (0, 0)
+    #whether the left, middle and right mouse buttons are held
+    mouse_buttons: tuple = (False, False, False)
+    #mouse buttons (1 is left) that went down or up since the last update
+    buttons_pressed: frozenset = frozenset()
+    buttons_released: frozenset = frozenset()
+    #keys (like pygame.K_SPACE) that are held, and that went down or up since the last update
+    keys: frozenset = frozenset()
+    keys_pressed: frozenset = frozenset()
+    keys_released: frozenset = frozenset()
+
+class InputTracker:
+    """
+    Keeps track of what's held between frames, and makes a snapshot for each frame from its events.
+    A frame can run any number of updates (see main.run_updates), so presses and releases are only given to the
+    first update after they happen (see consume), and are carried on to the next frame if no update saw them
+    """
+    def __init__(self):
+        self.mouse_pos = None
+        self.mouse_buttons = [False, False, False]
+        self.keys = set()
+        self.snapshot = InputSnapshot()
+        #the snapshot without any presses or releases, for the updates after the first
+        self.held_snapshot = self.snapshot
+        #whether an update has seen the presses and releases in self.snapshot
+        self.consumed = True
+
+    def reset(self):
+        self.__init__()
+
+    def take(self, events, offset=(0, 0)):
+        """
+        Make the snapshot for a frame from its events.
+        offset is the top corner of the current microgame's box, for local_mouse_pos
+        """
+        if self.mouse_pos is None:
+            #nothing to go on yet, so ask SDL this once
+            from display import display
+            self.mouse_pos = display.to_screen(pygame.mouse.get_pos())
+
+        buttons_pressed = set()
+        buttons_released = set()
+        keys_pressed = set()
+        keys_released = set()
+        if not self.consumed:
+            #no update saw the last frame's presses and releases, so they go on to this one
+            buttons_pressed.update(self.snapshot.buttons_pressed)
+            buttons_released.update(self.snapshot.buttons_released)
+            keys_pressed.update(self.snapshot.keys_pressed)
+            keys_released.update(self.snapshot.keys_released)
+
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                self.mouse_pos = event.pos
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                self.mouse_pos = event.pos
+                buttons_pressed.add(event.button)
+                if 1 <= event.button <= 3:
+                    self.mouse_buttons[event.button-1] = True
+
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self.mouse_pos = event.pos
+                buttons_released.add(event.button)
+                if 1 <= event.button <= 3:
+                    self.mouse_buttons[event.button-1] = False
+
+            elif event.type == pygame.KEYDOWN:
+                self.keys.add(event.key)
+                keys_pressed.add(event.key)
+
+            elif event.type == pygame.KEYUP:
+                self.keys.discard(event.key)
+                keys_released.add(event.key)
+
+            elif event.type == pygame.WINDOWFOCUSLOST:
+                #we won't hear about anything let go while the window isn't focused
+                self.mouse_buttons = [False, False, False]
+                self.keys.clear()
+
+        mx, my = self.mouse_pos
+        self.snapshot = InputSnapshot(
+            (mx, my),
+            (mx-offset[0], my-offset[1]),
+            tuple(self.mouse_buttons),
+            frozenset(buttons_pressed),
+            frozenset(buttons_released),
+            frozenset(self.keys),
+            frozenset(keys_pressed),
+            frozenset(keys_released),
+        )
+        self.held_snapshot = self.get_held_snapshot(self.snapshot)
+        self.consumed = False
+        return self.snapshot
+
+    def get_held_snapshot(self, snapshot):
+        return snapshot._replace(buttons_pressed=frozenset(), buttons_released=frozenset(), keys_pressed=frozenset(), keys_released=frozenset())
+
+    def restore(self, snapshot, consumed):
+        """
+        Go back to the state a snapshot was taken in, as if it had just been taken (and seen by an update if consumed).
+        Returns the snapshot updates should get now. This is how recording.replay starts with the input a game started with
+        """
+        self.mouse_pos = snapshot.mouse_pos
+        self.mouse_buttons = list(snapshot.mouse_buttons)
+        self.keys = set(snapshot.keys)
+        self.snapshot = snapshot
+        self.held_snapshot = self.get_held_snapshot(snapshot)
+        self.consumed = consumed
+        return self.held_snapshot if consumed else self.snapshot
+
+    def consume(self):
+        """
+        Mark this frame's presses and releases as seen, returning the snapshot the rest of the frame's updates should get.
+        This is called by main.update after every update
+        """
+        self.consumed = True
+        return self.held_snapshot
+
+#the tracker main.py uses
+tracker = InputTracker()
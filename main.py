@@ -1,57 +1,147 @@
+import pygame
 import global_values as g
 import controls
+import bindings
+import fonts
+import thumbnails
+import asset_manager
+import input_state
+from profiler import profiler
+from runner import runner
+from registry import registry
+import recording
+from display import display
+from recording import recorder
+
+def quit_game(event):
+    thumbnails.save_all()
+    pygame.display.quit()
+    import sys
+    sys.exit()
+
+def redraw_screen(event):
+    g.full_redraw = True
+
+def end_game(event):
+    """
+    Fully finish a microgame once its post time is up
+    """
+    if event.game is g.current_game:
+        g.current_game.end()
+        if runner.active:
+            runner.start_next()
+
+def click_controls(event):
+    for control in g.controls.get_at(event.pos, g.state):
+        result = control.click()
+        if result:
+            break
+
+#key -> function to call when it's pressed
+KEY_HANDLERS = {
+    pygame.K_F3:profiler.toggle, #toggle profiler
+    pygame.K_ESCAPE:runner.stop, #leave runner mode after this game
+}
+
+def press_key(event):
+    function = KEY_HANDLERS.get(event.key)
+    if function:
+        function()
+
+def register_event_handlers():
+    """
+    Register the handlers for events the main loop deals with itself
+    """
+    g.events.register(pygame.QUIT, quit_game)
+    g.events.register(pygame.VIDEOEXPOSE, redraw_screen)
+    g.events.register(pygame.WINDOWEXPOSED, redraw_screen)
+    g.events.register(g.MICROGAME_END_EVENT, end_game)
+    g.events.register(pygame.MOUSEBUTTONUP, click_controls)
+    g.events.register(pygame.KEYDOWN, press_key)
+    g.events.allow(*input_state.EVENT_TYPES)
 
 def handle_input():
-    event_list = []
-    for event in pygame.event.get():
-        if event.type == pygame.MOUSEBUTTONUP:
-            for control in g.controls:
-                if control.rect.collidepoint(event.pos) and control.get_active():
-                    result = control.click()
-                    if result:
-                        break
-
-        #filter out certain events
-        if event.type == pygame.QUIT: #quit
-            pygame.display.quit()
-            import sys
-            sys.exit()
-
-        elif event.type == g.MICROGAME_END_EVENT: #fully finish game
-            g.current_game.end()
-
-        elif event.type == g.MICROGAME_TIMEOUT_EVENT: #run out of time for game
-            if event.game == type(g.current_game) and not g.current_game.ended:
-                g.current_game.lose()
-
-        elif event.type == g.TEXT_BOX_DELETE_EVENT: #delete text box
-            for control in g.controls:
-                if control == event.control:
-                    control.delete()
-                    break
-
-        elif event.type == g.RUN_GAME_EVENT: #run new microgame
-            new_game = event.game()
-            new_game.run()
+    """
+    Handle all the events since the last frame, returning whether there were any
+    """
+    events = pygame.event.get()
+    g.events.update_filter()
+    display.map_events(events)
 
-        else:
-            if event.type == pygame.MOUSEWHEEL: #scroll gallery
-                for control in g.controls:
-                    if type(control) == controls.ScrollBar:
-                        if control.get_active():
-                            control.scroll_value = min(max(control.scroll_value-(0.01*event.y), 0), 1.0)
-            
-            event_list.append(event)
+    if g.current_game:
+        offset = g.current_game.rect.topleft
+    else:
+        offset = (0, 0)
+    g.frame_input = input_state.tracker.take(events, offset)
+
+    if recorder.recording:
+        recorder.record_events(events)
+
+    g.events.dispatch(events)
 
     if g.current_game:
-        g.current_game.handle_input(event_list)
+        g.current_game.handle_queued_events()
+
+    return bool(events)
 
 def update(dt):
+    #a microgame can start part way through an update (from a timer, or the runner), see recording.Recorder.start
+    recorder.start_update(dt)
+    timers_fired = g.timers.fired
+    g.timers.update(dt)
+    if recorder.recording:
+        recorder.record_update(dt, g.timers.fired-timers_fired)
+
+    update_after_timers(dt)
+    recorder.end_update()
+
+def update_after_timers(dt):
+    """
+    The part of update after the timers have moved on
+    """
+    runner.update()
+
+    if profiler.enabled:
+        if g.current_game:
+            profiler.time_control(f"{type(g.current_game).__name__}.update", g.current_game.update, dt)
+        if g.current_game:
+            profiler.time_control(f"{type(g.current_game).__name__}.update_effects", g.current_game.update_effects, dt)
+        for control in g.controls.get_active(g.state):
+            profiler.time_control(f"{profiler.get_label(control)}.update", control.update, g.frame_input)
+        g.frame_input = input_state.tracker.consume()
+        return
+
     if g.current_game:
         g.current_game.update(dt)
-    for control in g.controls:
-        if control.get_active():
-            control.update()
+    if g.current_game:
+        g.current_game.update_effects(dt)
+    for control in g.controls.get_active(g.state):
+        control.update(g.frame_input)
+
+    #only the first update after a press or release sees it
+    g.frame_input = input_state.tracker.consume()
+
+def run_updates(dt):
+    """
+    Update everything for a frame that took dt ms.
+    With a fixed timestep, update is called with the same dt as many times as needed to catch up.
+    After an idle frame only one update is run, as the time spent idling doesn't need catching up on
+    """
+    if not g.FIXED_TIMESTEP:
+        update(dt)
+        g.frame_alpha = 0
+        return
+
+    step = 1000/g.UPDATE_RATE
+    if g.idle:
+        g.update_accumulator = min(g.update_accumulator+dt, step)
+    else:
+        g.update_accumulator = min(g.update_accumulator+dt, g.MAX_FRAME_TIME)
+    while g.update_accumulator >= step:
+        update(step)
+        g.update_accumulator -= step
+
+    g.frame_alpha = g.update_accumulator/step
 
 def load_game(game):
     """
@@ -60,66 +150,150 @@ def load_game(game):
     g.current_game = game
 
 def draw():
-    if g.current_game:
-        #draw microgame at center of screen
-        microgame_surf = g.current_game.draw()
+    """
+    Draw everything that has changed, and update those parts of the display.
+    Returns whether anything was drawn
+    """
+    #changing state or microgame changes everything
+    if g.state != g.drawn_state or g.current_game is not g.drawn_game:
+        g.drawn_state = g.state
+        g.drawn_game = g.current_game
+        g.full_redraw = True
+
+    if not g.DIRTY_RECTS or (g.current_game and g.current_game.metadata["full_redraw"]):
+        g.full_redraw = True
+
+    if profiler.enabled:
+        g.dirty_rects.append(profiler.overlay_rect)
+
+    if g.current_game and not g.full_redraw:
+        microgame_dirty_rects = g.current_game.get_dirty_rects()
+        effects = g.current_game.effects
+        if microgame_dirty_rects is None or (effects is not None and effects.is_active()):
+            g.dirty_rects.append(g.current_game.rect)
+        else:
+            for rect in microgame_dirty_rects:
+                g.dirty_rects.append(rect.move(g.current_game.rect.topleft))
 
-        width = g.current_game.metadata["width"]
-        height = g.current_game.metadata["height"]
+    if g.full_redraw:
+        g.screen.set_clip(None)
+    elif g.dirty_rects:
+        #clip to everything that changed, reusing the same rect every frame
+        g.clip_rect.update(g.dirty_rects[0])
+        for rect in g.dirty_rects:
+            g.clip_rect.union_ip(rect)
+        g.screen.set_clip(g.clip_rect)
+    else:
+        #nothing has changed
+        return False
 
-        microgame_rect = pygame.Rect(0, 0, width, height)
-        microgame_rect.center = (g.WIDTH/2, g.HEIGHT/2)
+    g.screen.fill((0,0,0))
 
-        g.screen.blit(microgame_surf, microgame_rect)
+    #draw effects where they'd be by now, between the last update and the next
+    effects_ahead = g.frame_alpha*1000/g.UPDATE_RATE
 
-    for control in g.controls:
-        if control.get_active():
+    if profiler.enabled:
+        if g.current_game:
+            microgame_surf = profiler.time_control(f"{type(g.current_game).__name__}.draw", g.current_game.draw)
+            g.screen.blit(microgame_surf, g.current_game.rect)
+            if g.current_game.effects is not None:
+                profiler.time_control(f"{type(g.current_game).__name__}.effects.draw", g.current_game.effects.draw, g.screen, g.current_game.rect, effects_ahead)
+        for control in g.controls.get_active(g.state):
+            profiler.time_control(f"{profiler.get_label(control)}.draw", control.draw)
+        profiler.draw_overlay()
+
+    else:
+        if g.current_game:
+            #draw microgame at center of screen
+            microgame_surf = g.current_game.draw()
+            g.screen.blit(microgame_surf, g.current_game.rect)
+            if g.current_game.effects is not None:
+                g.current_game.effects.draw(g.screen, g.current_game.rect, effects_ahead)
+
+        for control in g.controls.get_active(g.state):
             control.draw()
 
+    g.screen.set_clip(None)
+
+    #everything inside the clip rect was redrawn. Passing pygame a list of rects allocates every frame
+    display.present(g.full_redraw, g.clip_rect)
+
+    g.dirty_rects.clear()
+    g.full_redraw = False
+
+    return True
+
+def run_frame(dt):
+    """
+    Run one frame of the core loop, returning whether it was idle (nothing happened, nothing is running and no timers are
+    waiting, as those need the game clock to keep up)
+    """
+    if profiler.enabled:
+        profiler.start_frame()
+        had_input = profiler.time_phase("handle_input", handle_input)
+        profiler.time_phase("invalidate", bindings.invalidate)
+        profiler.time_phase("update", run_updates, dt)
+        drew = profiler.time_phase("draw", draw)
+        profiler.end_frame()
+    else:
+        had_input = handle_input()
+        bindings.invalidate()
+        run_updates(dt)
+        drew = draw()
+
+    g.idle = not (had_input or drew or g.current_game or runner.active or len(g.timers))
+    return g.idle
+
 def enter_runner_mode():
-    pass
+    runner.start(registry.discover())
 
 def enter_gallery_mode():
     g.state = "gallery"
 
 def back_to_menu():
     g.state = "main_menu"
+    thumbnails.save_all()
 
 def run_test_game():
     import test_game
+    asset_manager.manager.preload(test_game.TestGame.asset_paths)
     game = test_game.TestGame()
+    recording.begin(game)
     game.run()
 
-if __name__ == "__main__":
-    import pygame
-    
-    clock = pygame.time.Clock()
-    g.screen = pygame.display.set_mode((g.WIDTH, g.HEIGHT))
+def setup():
+    """
+    Open the window and make the menus
+    """
+    display.open(g.SCALE_MODE, g.WINDOW_SIZE, g.FULLSCREEN)
+
+    register_event_handlers()
 
     pygame.font.init()
-    default_font = pygame.font.SysFont("Consolas", 32)
+    default_font = fonts.get_font("Consolas", 32)
 
-    debug_text = controls.TextBox((g.WIDTH-200, 0), "g.state", default_font, 0, "white", True, set(("main_menu","gallery")), cx=True, cy=False)
+    debug_text = controls.TextBox((g.WIDTH-200, 0), lambda: g.state, default_font, 0, "white", set(("main_menu","gallery")), cx=True, cy=False)
 
     run_button = controls.create_button(pygame.Rect(0,32,128,64), "Runner", default_font, enter_runner_mode, "red", "white", set(("main_menu",)), border_width=4, border_radius=8)
     gallery_button = controls.create_button(pygame.Rect(0,96,128,64), "Gallery", default_font, enter_gallery_mode, "red", "white", set(("main_menu",)), border_width=4, border_radius=8)
     test_button = controls.create_button(pygame.Rect(0,160,128,64), "Test", default_font, run_test_game, "red", "white", set(("main_menu",)), border_width=4, border_radius=8)
 
-    import test_game
-    controls.Gallery(pygame.Rect(0, 50, g.WIDTH, g.HEIGHT), [test_game.TestGame]*50, set(("gallery",)) )
+    controls.Gallery(pygame.Rect(0, 50, g.WIDTH, g.HEIGHT), registry.discover(), set(("gallery",)) )
     return_to_menu_button = controls.create_button(pygame.Rect(g.WIDTH-110,g.HEIGHT-60,100,50), "Back", default_font, back_to_menu, "red", "white", set(("gallery",)), border_width=4)
 
 
     #setup window
     pygame.display.set_caption("Microgames")
 
+if __name__ == "__main__":
+    clock = pygame.time.Clock()
+    setup()
+
     #core loop
     dt = 0
     while True:
-        g.screen.fill("black")
-        handle_input()
-        update(dt)
-        draw()
-        pygame.display.flip()
-        dt = clock.tick()
-
+        idle = run_frame(dt)
+        if idle:
+            dt = clock.tick(g.IDLE_FPS)
+        else:
+            dt = clock.tick(g.FPS)
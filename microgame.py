@@ -4,22 +4,43 @@ DO NOT MODIFY THIS, INHERIT IT INSTEAD
 """
 import pygame
 import controls
+import fonts
+import asset_manager
+import surfaces
+import recording
+import resources
 import global_values as g
 
 class Microgame():
+    #metadata regarding the microgame. Set "metadata" in your own microgame class to change any of these,
+    #anything you leave out is taken from here. Keep it as a plain dict of plain values (no function calls),
+    #so the gallery can read it without having to load your game
+    metadata = {
+        "author":"Anonymous", #who made the game (please include Discord tags!)
+        "width":300, #resolution
+        "height":300,
+        "thumbnail":None, #surface to use as a thumbnail for this game, if None, a default is used
+        "show_cursor":True,
+        "time":5, #how long does the player have?
+        "post_time":1, #how long after winning/losing until we move on?
+        "full_redraw":False, #set this to redraw the whole screen every frame, rather than just the parts that changed
+
+        "comments":"", #anything extra you want to add
+    }
+
+    #images this microgame uses, as name -> path. These are loaded in the background before the game starts,
+    #use self.get_asset(name) to get them
+    asset_paths = {}
+
+    #the types of event handle_input is given. Other events aren't passed on, and if nothing else wants them,
+    #SDL doesn't even queue them. Add to this if your game needs other events (e.g. pygame.TEXTINPUT)
+    event_types = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEWHEEL, pygame.KEYDOWN, pygame.KEYUP)
+
     def __init__(self, _metadata={}):
-        #metadata regarding the microgame
-        self.metadata = {
-            "author":"Anonymous", #who made the game (please include Discord tags!)
-            "width":300, #resolution
-            "height":300,
-            "thumbnail":None, #surface to use as a thumbnail for this game, if None, a default is used
-            "show_cursor":True,
-            "time":5, #how long does the player have?
-            "post_time":1, #how long after winning/losing until we move on?
-
-            "comments":"", #anything extra you want to add
-        }
+        #combine the metadata of this class and every class it inherits from
+        self.metadata = {}
+        for cls in reversed(type(self).__mro__):
+            self.metadata.update(cls.__dict__.get("metadata", {}))
         self.metadata.update(_metadata)
 
         #whether this microgame is running in any capacity
@@ -28,47 +49,190 @@ class Microgame():
         #whether the game has "ended", i.e. whether the player has won/lost
         self.ended = True
 
-        #the surface used for drawing on. Note that you don't have to use this if you don't want to, as the
-        #thing that's drawn onto the screen is whatever is returned by the draw method. You could always draw
-        #onto a different surface and return that, though there wouldn't be much point.
-        self.surf = pygame.Surface((self.metadata["width"], self.metadata["height"]))
+        #the surface used for drawing on (see Microgame.surf). It is only made once it is first used
+        self._surf = None
+        #whether self._surf came from the surface pool, and should be given back when the game ends
+        self.surf_pooled = False
+
+        #where the microgame is drawn on the screen
+        self.rect = pygame.Rect(0, 0, self.metadata["width"], self.metadata["height"])
+        self.rect.center = (g.WIDTH/2, g.HEIGHT/2)
 
         #when this game started running
         self.start_time = None
 
-        if not self.metadata["thumbnail"]:
-            thumbnail_width = 64
-            thumbnail_height = 64
-            thumbnail = pygame.Surface((thumbnail_width, thumbnail_height))
-            thumbnail.fill("white")
+        #name -> surface, for the assets in asset_paths once they have been loaded
+        self.assets = None
+        #whether prepare preloaded the assets and they haven't been acquired since, so unload has to cancel the preload
+        self.assets_preloaded = False
 
-            pygame.draw.rect(thumbnail, "red", pygame.Rect(0, 0, thumbnail_width, thumbnail_height), 2)
+        #events of the types in event_types since handle_input was last called
+        self.event_queue = []
 
-            #TODO: remove this and replace with something better?
-            thumbnail_font = pygame.font.SysFont("Consolas", 16)
-            thumbnail_string = self.__class__.__name__[:min(len(self.__class__.__name__),4)]
-            thumbnail_text = thumbnail_font.render(thumbnail_string, True, "black")
-            thumbnail.blit(thumbnail_text, ( (thumbnail.get_width()/2)-(thumbnail_text.get_width()/2) , (thumbnail.get_height()/2)-(thumbnail_text.get_height()/2) ))
-            
+        #whether load has been called (and unload hasn't been since)
+        self.loaded = False
+
+        #the countdown and "Success"/"Failure" text, while they're shown
+        self.timer_text = None
+        self.finish_text = None
+        #the countdown text, and the time left (in centiseconds) it was made for
+        self.formatted_time = None
+        self.formatted_time_left = None
+
+        #particle effects drawn over the game, like the confetti when it's won. Made the first time get_effects is called
+        self.effects = None
+
+    def get_thumbnail(self):
+        """
+        Get the surface to use as this microgame's thumbnail. If the "thumbnail" metadata isn't set, a default is made
+        """
+        if self.metadata["thumbnail"]:
+            return self.metadata["thumbnail"]
+
+        thumbnail_width = 64
+        thumbnail_height = 64
+        thumbnail = pygame.Surface((thumbnail_width, thumbnail_height))
+        thumbnail.fill("white")
+
+        pygame.draw.rect(thumbnail, "red", pygame.Rect(0, 0, thumbnail_width, thumbnail_height), 2)
+
+        #TODO: remove this and replace with something better?
+        thumbnail_font = fonts.get_font("Consolas", 16)
+        thumbnail_string = self.__class__.__name__[:min(len(self.__class__.__name__),4)]
+        thumbnail_text = thumbnail_font.render(thumbnail_string, True, "black")
+        thumbnail.blit(thumbnail_text, ( (thumbnail.get_width()/2)-(thumbnail_text.get_width()/2) , (thumbnail.get_height()/2)-(thumbnail_text.get_height()/2) ))
+
+        return thumbnail
+
+    @property
+    def surf(self):
+        """
+        The surface used for drawing on. Note that you don't have to use this if you don't want to, as the
+        thing that's drawn onto the screen is whatever is returned by the draw method. You could always draw
+        onto a different surface and return that, though there wouldn't be much point.
+        This is taken from a pool of surfaces the first time it's used, and given back when the game ends
+        """
+        if self._surf is None:
+            self._surf = surfaces.pool.acquire((self.metadata["width"], self.metadata["height"]))
+            self.surf_pooled = True
+        return self._surf
 
-            self.metadata["thumbnail"] = thumbnail
+    @surf.setter
+    def surf(self, surf):
+        self.release_surf()
+        self._surf = surf
 
+    def release_surf(self):
+        """
+        Give the drawing surface back to the pool, if it came from there
+        """
+        if self._surf is not None and self.surf_pooled:
+            surfaces.pool.release(self._surf)
+        self._surf = None
+        self.surf_pooled = False
 
     def get_mouse_pos(self):
         """
-        Get the mouse position relative to the top corner of the microgame box
+        Get the mouse position relative to the top corner of the microgame box.
+        This is from the input snapshot taken at the start of the frame, see get_input
+        """
+        mx, my = g.frame_input.mouse_pos
+        return mx - self.rect.x, my - self.rect.y
+
+    def get_input(self):
+        """
+        Get this frame's input_state.InputSnapshot, with the mouse position, which buttons and keys are held,
+        and which were pressed or released this frame. Its local_mouse_pos is the same as get_mouse_pos()
         """
-        mx, my = pygame.mouse.get_pos()
-        ox = (g.WIDTH/2) - (self.metadata["width"]/2)
-        oy = (g.HEIGHT/2) - (self.metadata["height"]/2)
-        x = mx - ox
-        y = my - oy
-        return x, y
+        return g.frame_input
+
+    def acquire_assets(self):
+        """
+        Get hold of this microgame's assets, waiting for them to load if needed.
+        This has to be called from the main thread, and is called automatically by get_asset
+        """
+        if self.assets is None:
+            self.assets = asset_manager.manager.acquire(self.asset_paths)
+            self.assets_preloaded = False
+
+    def get_asset(self, name):
+        """
+        Get one of the images declared in asset_paths, converted to the display's pixel format
+        """
+        self.acquire_assets()
+        return self.assets[name]
+
+    def release_assets(self):
+        """
+        Let go of this microgame's assets. This is called automatically when the microgame ends
+        """
+        if self.assets is not None:
+            asset_manager.manager.release(self.asset_paths)
+            self.assets = None
+        elif self.assets_preloaded:
+            asset_manager.manager.cancel_preload(self.asset_paths)
+            self.assets_preloaded = False
+
+    def load(self):
+        """
+        Get hold of what this microgame needs to run, its assets and drawing surface.
+        This is called automatically before the game runs, and can be called again after unload.
+        If your game makes anything else big (surfaces, sounds, etc), make it here (remember to call super().load())
+        and let go of it in unload
+        """
+        if self.loaded:
+            resources.tracker.touch(self)
+            return
+
+        self.acquire_assets()
+        self.surf
+        self.loaded = True
+        resources.tracker.add(self)
+
+    def unload(self):
+        """
+        Let go of what load got hold of. This is called automatically when the game ends,
+        or if it's waiting to run and memory is over budget (see g.MEMORY_BUDGET)
+        """
+        self.loaded = False
+        resources.tracker.remove(self)
+
+        self.release_surf()
+        self.release_assets()
+        self.effects = None
+
+    def get_memory_usage(self):
+        """
+        Get roughly how many bytes this microgame is using. If your game makes anything big in load, add it on here
+        """
+        usage = 0
+        if self._surf is not None:
+            usage += resources.get_surface_bytes(self._surf)
+        if self.assets:
+            usage += sum(resources.get_surface_bytes(asset) for asset in self.assets.values())
+        if self.effects is not None:
+            usage += self.effects.get_memory_usage()
+        return usage
+
+    def prepare(self):
+        """
+        Do the slow parts of starting the microgame ahead of time, so that run() is quick.
+        This is called by runner mode while the previous microgame is still playing.
+        If you load anything else slow in run(), you can do it here instead (remember to call super().prepare())
+        """
+        #fonts used by the timer and finish text
+        fonts.get_font("Consolas", 32)
+
+        if self.assets is None and not self.assets_preloaded:
+            asset_manager.manager.preload(self.asset_paths)
+            self.assets_preloaded = True
 
     def run(self):
         """
         Run the microgame
         """
+        self.load()
+
         self.running = True
         self.ended = False
         g.current_game = self
@@ -76,38 +240,65 @@ class Microgame():
         self.start_time = pygame.time.get_ticks()
         self.finish_text = None
 
+        for event_type in self.event_types:
+            g.events.register(event_type, self.queue_event, owner=self)
+
         if self.metadata["show_cursor"]:
             pygame.mouse.set_visible(True)
         else:
             pygame.mouse.set_visible(False)
 
-        #timeout event
-        end_event = pygame.event.Event(g.MICROGAME_TIMEOUT_EVENT, {"game":type(self)})
-        pygame.time.set_timer(end_event, self.metadata["time"]*1000, loops=1)
+        #lose if we run out of time
+        self.timeout_timer = g.timers.add(self.metadata["time"]*1000, self.timeout, owner=self)
         
         #GUI
         #TODO: CHANGE ACTIVE STATES
         timer_pos = (g.WIDTH/2, (g.HEIGHT/2) - (self.metadata["height"]/2))
-        self.timer_text = controls.TextBox(timer_pos, "g.current_game.get_formatted_time()", pygame.font.SysFont("Consolas", 32), self.metadata["time"], "white", True, set(("main_menu",)), cx=True, cy=False)
+        self.timer_text = controls.TextBox(timer_pos, self.get_formatted_time, fonts.get_font("Consolas", 32), self.metadata["time"], "white", set(("main_menu",)), cx=True, cy=False, use_glyphs=True)
+
+    def timeout(self):
+        """
+        Called when the player runs out of time
+        """
+        if not self.ended:
+            self.lose()
 
     def get_formatted_time(self):
         if self.start_time is None:
-            text = "N/A"
-        else:
-            diff = self.metadata["time"]*1000 - (pygame.time.get_ticks() - self.start_time)
-            seconds = int(diff // 1000)
-            centiseconds = int(diff % 1000 // 10)
-            text = f"{ str(seconds).zfill(2) }:{ str(centiseconds).zfill(2) }"
+            return "N/A"
+
+        #only make a new string when what's shown changes
+        time_left = int(self.timeout_timer.get_remaining() // 10)
+        if time_left != self.formatted_time_left:
+            seconds, centiseconds = divmod(time_left, 100)
+            self.formatted_time = f"{ str(seconds).zfill(2) }:{ str(centiseconds).zfill(2) }"
+            self.formatted_time_left = time_left
 
-        return text
+        return self.formatted_time
 
     def finish(self, win):
         """
         Finish this microgame. This is called whenever "Microgame.win" or "Microgame.lose" is called
         """
+        #only the first win or lose counts
+        if self.ended:
+            return
         self.ended = True
-        end_event = pygame.event.Event(g.MICROGAME_END_EVENT)
-        pygame.time.set_timer(end_event, self.metadata["post_time"]*1000, loops=1)
+        self.timeout_timer.cancel()
+        end_event = pygame.event.Event(g.MICROGAME_END_EVENT, {"game":self})
+        g.timers.add(self.metadata["post_time"]*1000, pygame.event.post, end_event, owner=self)
+
+        #effects, from the middle of the game. These need numpy, so they're left out if it isn't installed
+        try:
+            import particles
+        except ImportError:
+            particles = None
+        if particles is not None:
+            effects_pos = (self.metadata["width"]/2, self.metadata["height"]/2)
+            if win:
+                particles.confetti(self.get_effects(), effects_pos)
+            else:
+                particles.debris(self.get_effects(), effects_pos)
 
         #finish text
         finish_pos = (g.WIDTH/2, (g.HEIGHT/2) - (self.metadata["height"]/2) + 50)
@@ -119,7 +310,7 @@ class Microgame():
             color = "red"
 
         #TODO change active states
-        self.finish_text = controls.TextBox(finish_pos, text, pygame.font.SysFont("Consolas", 32), self.metadata["post_time"], color, False, set(("main_menu",)), cx=True, cy=False)
+        self.finish_text = controls.TextBox(finish_pos, text, fonts.get_font("Consolas", 32), self.metadata["post_time"], color, set(("main_menu",)), cx=True, cy=False)
 
         print("delete")
         self.timer_text.delete()
@@ -132,6 +323,22 @@ class Microgame():
         self.running = False
         g.current_game = None
 
+        #stop any timers that haven't gone off yet
+        g.timers.cancel_owner(self)
+        g.events.unregister_owner(self)
+        self.event_queue.clear()
+
+        recording.recorder.stop(self)
+
+        #get rid of the text if it's still up
+        for text_box in (self.timer_text, self.finish_text):
+            if text_box is not None:
+                text_box.delete()
+        self.timer_text = None
+        self.finish_text = None
+
+        self.unload()
+
         pygame.mouse.set_visible(True)
 
     def win(self):
@@ -152,11 +359,39 @@ class Microgame():
         self.finish(False)
 
 
+    def get_effects(self):
+        """
+        Get the particles.ParticleSystem drawn over this game. Emit particles into it for effects of your own,
+        it's updated and drawn automatically. This needs numpy, which is only imported the first time it's called
+        """
+        if self.effects is None:
+            import particles
+            self.effects = particles.ParticleSystem()
+        return self.effects
+
+    def update_effects(self, delta):
+        """
+        Move the effects on. This is called by the main loop every frame, after update
+        """
+        if self.effects is not None:
+            self.effects.update(delta)
+
+    def handle_queued_events(self):
+        """
+        Pass the events queued since the last frame to handle_input. This is called by the main loop every frame
+        """
+        event_list = self.event_queue
+        self.event_queue = []
+        self.handle_input(event_list)
+
+    def queue_event(self, event):
+        self.event_queue.append(event)
+
     def handle_input(self, event_list):
         """
         Handle all the events that occured since the previous frame.
-        This is similar to pygame.event.get(), though event_list will not contain
-        events with the pygame.QUIT event type. This is automatically called every frame.
+        This is similar to pygame.event.get(), though event_list will only contain
+        events with the types in event_types. This is automatically called every frame.
         Please implement this function within your own microgame.
         """
         pass
@@ -172,13 +407,26 @@ class Microgame():
             x, y = self.finish_text.pos
             self.finish_text.pos = (x, y + (drift*delta) ) 
 
+    def get_dirty_rects(self):
+        """
+        Get the parts of the microgame that have changed since the last frame, relative to the top corner of the microgame box.
+        Return None if the whole microgame has changed, or an empty list if nothing has.
+        This is automatically called every frame, and by default the whole microgame is redrawn.
+        You can implement this in your own microgame if only small parts of it change.
+        """
+        return None
+
     def draw(self):
         """
         Draw the microgame and return the result.
         This is automatically called every frame.
         Please implement this function within your own microgame.
+        Updates run at a fixed rate, so several frames can be drawn between two updates (or several updates run between
+        two frames). To smooth out movement, draw things between where they were and where they are, e.g. keep
+        last_x in update and draw at last_x + (x-last_x)*g.frame_alpha
         """
-        return pygame.Surface((self.metadata["width"], self.metadata["height"]))
+        self.surf.fill((0,0,0))
+        return self.surf
             
             
 
@@ -0,0 +1,178 @@
+"""
+This is a file for particle effects, like confetti when a microgame is won.
+Particles are kept in numpy arrays (one array per property, not one object per particle), so moving them and drawing
+them doesn't loop over them in Python, and tens of thousands of them are fine.
+Positions are in microgame coordinates (like Microgame.get_mouse_pos), velocities are in pixels per millisecond, and
+particles are drawn as single pixels (or squares, see size) straight into a surface's pixels with pygame.surfarray.
+Every microgame has one for its win/lose effects, see Microgame.get_effects
+"""
+import math
+import random
+import numpy as np
+import pygame
+
+CONFETTI_COLORS = ((255,64,64), (255,200,0), (64,200,64), (64,128,255), (255,105,180), (255,255,255))
+DEBRIS_COLORS = ((96,96,96), (128,128,128), (160,32,32))
+
+class ParticleSystem:
+    """
+    Up to capacity particles, the live ones at the start of each array.
+    The arrays start small and double in size when they fill up, so effects that only need a few don't take much memory
+    """
+    def __init__(self, capacity=20000, gravity=(0, 0.0005), drag=0.001, size=2):
+        self.capacity = capacity
+        #pixels per millisecond per millisecond
+        self.gravity = np.array(gravity, dtype=np.float32)
+        #fraction of velocity lost per millisecond
+        self.drag = drag
+        #width of the square each particle is drawn as
+        self.size = size
+
+        self.positions = np.zeros((0, 2), dtype=np.float32)
+        self.velocities = np.zeros((0, 2), dtype=np.float32)
+        #how long each particle has been alive and how long it lives for (ms)
+        self.ages = np.zeros(0, dtype=np.float32)
+        self.lifetimes = np.zeros(0, dtype=np.float32)
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+        #how many particles are alive
+        self.count = 0
+        #how many were drawn last time, so the frame after the last one dies still gets redrawn
+        self.drawn_count = 0
+
+        #seeded from random, so recordings replay the same effects
+        self.rng = np.random.default_rng(random.getrandbits(32))
+
+    def __len__(self):
+        return self.count
+
+    def is_active(self):
+        """
+        Whether there's anything to draw, or something drawn last frame to get rid of
+        """
+        return bool(self.count or self.drawn_count)
+
+    def get_arrays(self):
+        return (self.positions, self.velocities, self.ages, self.lifetimes, self.colors)
+
+    def reserve(self, count):
+        """
+        Make sure the arrays have room for count particles (up to capacity)
+        """
+        size = len(self.ages)
+        if count <= size:
+            return
+        size = min(max(count, size*2, 1024), self.capacity)
+
+        arrays = []
+        for array in self.get_arrays():
+            grown = np.zeros((size,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            arrays.append(grown)
+        self.positions, self.velocities, self.ages, self.lifetimes, self.colors = arrays
+
+    def emit(self, count, pos, speed=(0.05, 0.2), angle=(0, 2*math.pi), lifetime=(500, 1500), colors=((255,255,255),)):
+        """
+        Add particles at pos, going off at random speeds, angles and lifetimes within the given (min, max) ranges,
+        each with one of colors picked at random. If there isn't room for them all, some aren't added
+        """
+        count = min(count, self.capacity-self.count)
+        if count <= 0:
+            return
+        self.reserve(self.count+count)
+        new = slice(self.count, self.count+count)
+
+        angles = self.rng.uniform(angle[0], angle[1], count)
+        speeds = self.rng.uniform(speed[0], speed[1], count)
+        self.positions[new] = pos
+        self.velocities[new, 0] = np.cos(angles)*speeds
+        self.velocities[new, 1] = np.sin(angles)*speeds
+        self.ages[new] = 0
+        self.lifetimes[new] = self.rng.uniform(lifetime[0], lifetime[1], count)
+        self.colors[new] = np.asarray(colors, dtype=np.uint8)[self.rng.integers(0, len(colors), count)]
+        self.count += count
+
+    def update(self, delta):
+        """
+        Move every particle on by delta milliseconds, and get rid of the ones that have run out of life
+        """
+        if not self.count:
+            return
+        alive = slice(0, self.count)
+
+        velocities = self.velocities[alive]
+        velocities += self.gravity*delta
+        velocities *= max(0.0, 1.0 - self.drag*delta)
+        self.positions[alive] += velocities*delta
+        self.ages[alive] += delta
+
+        #move the live particles to the front
+        living = self.ages[alive] < self.lifetimes[alive]
+        count = int(np.count_nonzero(living))
+        if count < self.count:
+            for array in self.get_arrays():
+                array[:count] = array[alive][living]
+            self.count = count
+
+    def clear(self):
+        self.count = 0
+
+    def get_mapped_colors(self, surf, colors):
+        """
+        Turn (N, 3) colours into the surface's pixel format, like Surface.map_rgb does for one colour
+        """
+        shifts = surf.get_shifts()
+        losses = surf.get_losses()
+        masks = surf.get_masks()
+        mapped = np.full(len(colors), masks[3], dtype=np.uint32)
+        for channel in range(3):
+            mapped |= (colors[:, channel].astype(np.uint32) >> losses[channel]) << shifts[channel]
+        return mapped
+
+    def draw(self, surf, rect=None, ahead=0):
+        """
+        Draw the particles onto surf, with (0, 0) at the top left of rect (the whole surface if not given).
+        ahead is how many ms past the last update to draw them, so they move smoothly between fixed timestep updates.
+        Particles outside rect aren't drawn. This writes to the pixels directly, so surf's clip is ignored
+        """
+        self.drawn_count = self.count
+        if not self.count:
+            return
+
+        if rect is None:
+            rect = surf.get_rect()
+        rect = pygame.Rect(rect).clip(surf.get_rect())
+
+        if ahead:
+            positions = (self.positions[:self.count] + self.velocities[:self.count]*ahead).astype(np.int32)
+        else:
+            positions = self.positions[:self.count].astype(np.int32)
+        positions[:, 0] += rect.x
+        positions[:, 1] += rect.y
+        mapped = self.get_mapped_colors(surf, self.colors[:self.count])
+
+        pixels = pygame.surfarray.pixels2d(surf)
+        try:
+            for dx in range(self.size):
+                for dy in range(self.size):
+                    x = positions[:, 0] + dx
+                    y = positions[:, 1] + dy
+                    inside = (rect.left <= x) & (x < rect.right) & (rect.top <= y) & (y < rect.bottom)
+                    pixels[x[inside], y[inside]] = mapped[inside]
+        finally:
+            #the surface is locked until the pixel array is gone
+            del pixels
+
+    def get_memory_usage(self):
+        return sum(array.nbytes for array in self.get_arrays())
+
+def confetti(system, pos, count=2000):
+    """
+    Throw confetti up from pos
+    """
+    system.emit(count, pos, speed=(0.1, 0.45), angle=(math.pi*1.1, math.pi*1.9), lifetime=(800, 2000), colors=CONFETTI_COLORS)
+
+def debris(system, pos, count=600):
+    """
+    Bits going everywhere from pos, for when things go wrong
+    """
+    system.emit(count, pos, speed=(0.02, 0.2), lifetime=(400, 1000), colors=DEBRIS_COLORS)
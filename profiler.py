@@ -0,0 +1,169 @@
+"""
+This is a file for the built-in frame profiler.
+Press F3 to toggle it. While it's on, every phase of the frame, every control and the current microgame are timed,
+an overlay shows a frame time graph and the slowest controls, and averages are regularly written to a metrics file
+"""
+import os
+import time
+from collections import deque
+import pygame
+import global_values as g
+import fonts
+
+class Profiler:
+    """
+    Records high resolution timings for each frame
+    """
+    def __init__(self, history=120, top_n=5, export_path="profile.txt", export_interval=1000, export_max_bytes=1000000):
+        self.enabled = False
+
+        #frame times (ms) for the graph
+        self.frame_times = deque(maxlen=history)
+
+        #timings for the current frame, label -> ms
+        self.phase_times = {}
+        self.control_times = {}
+        #timings for the previous (complete) frame
+        self.last_phase_times = {}
+        self.last_control_times = {}
+
+        #totals since the last export, label -> [total ms, count]
+        self.phase_totals = {}
+        self.control_totals = {}
+
+        self.top_n = top_n
+
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.export_max_bytes = export_max_bytes
+        self.last_export = None
+
+        self.overlay_rect = pygame.Rect(0, g.HEIGHT-143, 220, 143)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        self.phase_totals.clear()
+        self.control_totals.clear()
+        self.last_export = time.perf_counter()
+        #get rid of (or show) the overlay
+        g.full_redraw = True
+
+    def get_label(self, control):
+        """
+        Get a name for a control that stays the same between frames, from its type and the order it was made in
+        """
+        return f"{type(control).__name__}#{g.controls.order.get(control)}"
+
+    def add_time(self, times, totals, label, ms):
+        times[label] = times.get(label, 0) + ms
+
+        total = totals.get(label)
+        if total is None:
+            totals[label] = [ms, 1]
+        else:
+            total[0] += ms
+            total[1] += 1
+
+    def time_phase(self, label, function, *args):
+        """
+        Call a function, recording how long it took as one phase of the frame
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.add_time(self.phase_times, self.phase_totals, label, (time.perf_counter()-start)*1000)
+        return result
+
+    def time_control(self, label, function, *args):
+        """
+        Call a function, recording how long it took against a control (or microgame)
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.add_time(self.control_times, self.control_totals, label, (time.perf_counter()-start)*1000)
+        return result
+
+    def start_frame(self):
+        self.phase_times = {}
+        self.control_times = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        frame_time = (time.perf_counter()-self.frame_start)*1000
+        self.frame_times.append(frame_time)
+        self.add_time(self.phase_times, self.phase_totals, "frame", frame_time)
+
+        self.last_phase_times = self.phase_times
+        self.last_control_times = self.control_times
+
+        now = time.perf_counter()
+        if (now-self.last_export)*1000 >= self.export_interval:
+            self.export()
+            self.last_export = now
+
+    def export(self):
+        """
+        Append the average timings since the last export to the metrics file, one "name{labels} value" line each.
+        Once the file gets too big it is moved to a backup and started again
+        """
+        if not self.phase_totals:
+            return
+
+        lines = [f"# time {time.time():.3f}"]
+        for label, (total, count) in sorted(self.phase_totals.items()):
+            lines.append(f'phase_time_ms{{phase="{label}"}} {total/count:.4f}')
+        for label, (total, count) in sorted(self.control_totals.items()):
+            lines.append(f'control_time_ms{{name="{label}"}} {total/count:.4f}')
+        self.phase_totals.clear()
+        self.control_totals.clear()
+
+        try:
+            if os.path.getsize(self.export_path) > self.export_max_bytes:
+                os.replace(self.export_path, self.export_path+".1")
+        except OSError:
+            pass
+
+        with open(self.export_path, "a") as f:
+            f.write("\n".join(lines)+"\n")
+
+    def draw_overlay(self):
+        """
+        Draw a frame time graph, the phase times of the last frame (h = handle_input, i = invalidate, u = update, d = draw, f = frame)
+        the slowest controls of the last frame, and how long runner mode's transitions between microgames have taken
+        """
+        from runner import runner
+
+        rect = self.overlay_rect
+        g.screen.fill((0,0,0), rect)
+        pygame.draw.rect(g.screen, "white", rect, 1)
+
+        #frame time graph, the line marks 60fps
+        graph_rect = pygame.Rect(rect.x+2, rect.y+2, rect.w-4, 40)
+        budget = 1000/60
+        scale = graph_rect.h/(budget*2)
+        for i, frame_time in enumerate(self.frame_times):
+            x = graph_rect.x + (i*graph_rect.w // self.frame_times.maxlen)
+            height = min(frame_time*scale, graph_rect.h)
+            if frame_time > budget:
+                color = "red"
+            else:
+                color = "green"
+            pygame.draw.line(g.screen, color, (x, graph_rect.bottom), (x, graph_rect.bottom-height))
+        pygame.draw.line(g.screen, "yellow", (graph_rect.x, graph_rect.bottom-(budget*scale)), (graph_rect.right, graph_rect.bottom-(budget*scale)))
+
+        font = fonts.get_font("Consolas", 12)
+        y = graph_rect.bottom+4
+        lines = [" ".join(f"{label[0]}:{ms:.2f}" for label, ms in self.last_phase_times.items())]
+        slowest = sorted(self.last_control_times.items(), key=lambda item: item[1], reverse=True)[:self.top_n]
+        for label, ms in slowest:
+            lines.append(f"{ms:6.3f} {label}")
+        if runner.stalls:
+            stats = runner.get_stats()
+            lines.append(f"runner: {stats['transitions']} games, max stall {stats['max_ms']:.2f}ms, {stats['over_budget']} over")
+
+        for line in lines:
+            g.screen.blit(font.render(line, True, "white"), (rect.x+4, y))
+            y += 13
+
+#the profiler main.py uses
+profiler = Profiler()
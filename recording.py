@@ -0,0 +1,358 @@
+"""
+This is a file for recording microgame sessions and replaying them.
+A recording has the random seed the game started with, the input it started with, the input events it was given and
+the dt of every update, so replaying it gives the same game. Replays run headless as fast as possible:
+    python recording.py <recording files>
+Recordings are a binary log, see the formats below
+"""
+import os
+import sys
+import time
+import struct
+import random
+import importlib
+import pygame
+import global_values as g
+import bindings
+import input_state
+
+#file header: magic, format version, random seed, game clock time (see timers.TimerScheduler), and the dt of the update
+#the game started part way through (0 if it started between updates).
+#Then the game key (e.g. "test_game.TestGame") as length + utf8, then the input it started with (see below)
+HEADER = struct.Struct("<4sBIdd")
+MAGIC = b"PGCR"
+VERSION = 2
+KEY_LENGTH = struct.Struct("<H")
+
+#input_state.InputSnapshot: mouse pos, local mouse pos, held mouse buttons as bits, and whether an update has seen its
+#presses and releases. Then buttons pressed, buttons released, keys held, keys pressed and keys released, each as a
+#count and then the buttons or keys
+SNAPSHOT = struct.Struct("<hhhhB?")
+SET_COUNT = struct.Struct("<H")
+SET_ITEM = struct.Struct("<i")
+
+#every record starts with a tag
+TAG = struct.Struct("<B")
+#the events from one call to main.handle_input, which starts a frame: number of events, then the events
+EVENTS = 0
+EVENT_COUNT = struct.Struct("<H")
+EVENT_TYPE = struct.Struct("<H")
+#some calls in a row to main.update: how many, dt, and how many timers fired in each
+UPDATES = 1
+UPDATE = struct.Struct("<Hdh")
+
+def write_motion_event(event):
+    buttons = sum(1 << index for index, held in enumerate(event.buttons) if held)
+    return struct.pack("<hhhhB", *event.pos, *event.rel, buttons)
+
+def read_motion_event(data, offset):
+    x, y, rel_x, rel_y, buttons = struct.unpack_from("<hhhhB", data, offset)
+    buttons = tuple(int(bool(buttons & (1 << index))) for index in range(3))
+    return {"pos":(x, y), "rel":(rel_x, rel_y), "buttons":buttons}, offset+9
+
+def write_button_event(event):
+    return struct.pack("<hhB", *event.pos, event.button)
+
+def read_button_event(data, offset):
+    x, y, button = struct.unpack_from("<hhB", data, offset)
+    return {"pos":(x, y), "button":button}, offset+5
+
+def write_wheel_event(event):
+    return struct.pack("<hh?", event.x, event.y, event.flipped)
+
+def read_wheel_event(data, offset):
+    x, y, flipped = struct.unpack_from("<hh?", data, offset)
+    return {"x":x, "y":y, "flipped":flipped}, offset+5
+
+def write_key_event(event):
+    text = getattr(event, "unicode", "").encode("utf8")[:255]
+    return struct.pack("<iHiB", event.key, event.mod, event.scancode, len(text)) + text
+
+def read_key_event(data, offset):
+    key, mod, scancode, length = struct.unpack_from("<iHiB", data, offset)
+    offset += 11
+    return {"key":key, "mod":mod, "scancode":scancode, "unicode":data[offset:offset+length].decode("utf8")}, offset+length
+
+def write_empty_event(event):
+    return b""
+
+def read_empty_event(data, offset):
+    return {}, offset
+
+#event type -> (function to pack an event, function to unpack one from (data, offset), giving (attributes, new offset)).
+#Only events of these types are recorded
+EVENT_FORMATS = {
+    pygame.MOUSEMOTION:(write_motion_event, read_motion_event),
+    pygame.MOUSEBUTTONDOWN:(write_button_event, read_button_event),
+    pygame.MOUSEBUTTONUP:(write_button_event, read_button_event),
+    pygame.MOUSEWHEEL:(write_wheel_event, read_wheel_event),
+    pygame.KEYDOWN:(write_key_event, read_key_event),
+    pygame.KEYUP:(write_key_event, read_key_event),
+    pygame.WINDOWFOCUSLOST:(write_empty_event, read_empty_event),
+}
+
+def write_snapshot(snapshot, consumed):
+    buttons = sum(1 << index for index, held in enumerate(snapshot.mouse_buttons) if held)
+    data = [SNAPSHOT.pack(*snapshot.mouse_pos, *snapshot.local_mouse_pos, buttons, consumed)]
+    for items in (snapshot.buttons_pressed, snapshot.buttons_released, snapshot.keys, snapshot.keys_pressed, snapshot.keys_released):
+        data.append(SET_COUNT.pack(len(items)) + b"".join(SET_ITEM.pack(item) for item in items))
+    return b"".join(data)
+
+def read_snapshot(data, offset):
+    """
+    Read an input snapshot, returning (snapshot, consumed, new offset)
+    """
+    x, y, local_x, local_y, buttons, consumed = SNAPSHOT.unpack_from(data, offset)
+    offset += SNAPSHOT.size
+    sets = []
+    for index in range(5):
+        (count,) = SET_COUNT.unpack_from(data, offset)
+        offset += SET_COUNT.size
+        sets.append(frozenset(SET_ITEM.unpack_from(data, offset + (item*SET_ITEM.size))[0] for item in range(count)))
+        offset += count*SET_ITEM.size
+    buttons = tuple(bool(buttons & (1 << index)) for index in range(3))
+    return input_state.InputSnapshot((x, y), (local_x, local_y), buttons, *sets), consumed, offset
+
+def get_game_key(game):
+    return f"{type(game).__module__}.{type(game).__qualname__}"
+
+class Recorder:
+    """
+    Writes a recording of the microgame that is running
+    """
+    def __init__(self):
+        self.recording = False
+        self.game = None
+        self.file = None
+
+        #the dt of the main.update in progress (0 between updates), and whether the recording started part way through
+        #it, after the timers moved on (see main.update)
+        self.update_dt = 0
+        self.started_in_update = False
+        #[count, dt, timers fired] for updates not written yet, so runs of the same update take one record
+        self.pending_updates = None
+
+    def start_update(self, dt):
+        self.update_dt = dt
+
+    def end_update(self):
+        self.update_dt = 0
+        self.started_in_update = False
+
+    def start(self, game, path):
+        """
+        Start recording a microgame that is about to run. This picks the random seed it will run with.
+        If this is part way through an update, the rest of that update is replayed straight after the game starts
+        """
+        self.stop()
+
+        seed = int.from_bytes(os.urandom(4), "little")
+        random.seed(seed)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "wb")
+        key = get_game_key(game).encode("utf8")
+        tracker = input_state.tracker
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, g.timers.time, self.update_dt) + KEY_LENGTH.pack(len(key)) + key
+                        + write_snapshot(tracker.snapshot, tracker.consumed))
+
+        self.recording = True
+        self.game = game
+        self.started_in_update = bool(self.update_dt)
+        self.pending_updates = None
+
+    def stop(self, game=None):
+        """
+        Stop recording, if the recording is of game (or any game if none is given)
+        """
+        if not self.recording or (game is not None and game is not self.game):
+            return
+        self.write_pending_updates()
+        self.file.close()
+        self.file = None
+        self.recording = False
+        self.game = None
+
+    def write_pending_updates(self):
+        if self.pending_updates is not None:
+            self.file.write(TAG.pack(UPDATES) + UPDATE.pack(*self.pending_updates))
+            self.pending_updates = None
+
+    def record_events(self, events):
+        """
+        Record the events from a call to main.handle_input
+        """
+        self.write_pending_updates()
+
+        packed = []
+        for event in events:
+            event_format = EVENT_FORMATS.get(event.type)
+            if event_format:
+                packed.append(EVENT_TYPE.pack(event.type) + event_format[0](event))
+
+        self.file.write(TAG.pack(EVENTS) + EVENT_COUNT.pack(len(packed)) + b"".join(packed))
+
+    def record_update(self, dt, timers_fired):
+        """
+        Record a call to main.update
+        """
+        if self.started_in_update:
+            #the clock had already moved on when the game started, the rest of this update is in the header
+            return
+
+        pending = self.pending_updates
+        if pending is not None and pending[1] == dt and pending[2] == timers_fired and pending[0] < 0xFFFF:
+            pending[0] += 1
+        else:
+            self.write_pending_updates()
+            self.pending_updates = [1, dt, timers_fired]
+
+#the recorder main.py uses
+recorder = Recorder()
+
+def get_recording_path(game):
+    return os.path.join(g.RECORDINGS_DIR, f"{get_game_key(game)}_{time.strftime('%Y%m%d_%H%M%S')}_{id(game):x}.rec")
+
+def begin(game):
+    """
+    Call this just before running a microgame, so it can be recorded if RECORD_INPUT is on
+    """
+    if g.RECORD_INPUT:
+        recorder.start(game, get_recording_path(game))
+
+def read_recording(path):
+    """
+    Read a recording, returning (seed, game clock time, first update dt, game key, (input snapshot, consumed), records).
+    Records are ("events", [pygame events]) or ("updates", count, dt, timers fired)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, seed, clock_time, first_update_dt = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} isn't a version {VERSION} recording")
+    offset = HEADER.size
+    (key_length,) = KEY_LENGTH.unpack_from(data, offset)
+    offset += KEY_LENGTH.size
+    key = data[offset:offset+key_length].decode("utf8")
+    offset += key_length
+    snapshot, consumed, offset = read_snapshot(data, offset)
+
+    records = []
+    while offset < len(data):
+        (tag,) = TAG.unpack_from(data, offset)
+        offset += TAG.size
+
+        if tag == EVENTS:
+            (count,) = EVENT_COUNT.unpack_from(data, offset)
+            offset += EVENT_COUNT.size
+            events = []
+            for index in range(count):
+                (event_type,) = EVENT_TYPE.unpack_from(data, offset)
+                attributes, offset = EVENT_FORMATS[event_type][1](data, offset+EVENT_TYPE.size)
+                events.append(pygame.event.Event(event_type, attributes))
+            records.append(("events", events))
+
+        elif tag == UPDATES:
+            records.append(("updates", *UPDATE.unpack_from(data, offset)))
+            offset += UPDATE.size
+
+        else:
+            raise ValueError(f"{path} has an unknown record at byte {offset-TAG.size}")
+
+    return seed, clock_time, first_update_dt, key, (snapshot, consumed), records
+
+def replay(path):
+    """
+    Replay a recording as fast as possible. main.setup() has to have been called.
+    Returns stats about the replay, including any updates where a different number of timers fired than when recorded
+    """
+    import main
+
+    seed, clock_time, first_update_dt, key, start_input, records = read_recording(path)
+
+    module_name, class_name = key.rsplit(".", 1)
+    game_class = getattr(importlib.import_module(module_name), class_name)
+
+    #get rid of anything left over from a previous replay
+    if g.current_game:
+        g.current_game.end()
+    pygame.event.get()
+
+    start = time.perf_counter()
+
+    #start from the input the game started with, rather than whatever the last replay left
+    g.frame_input = input_state.tracker.restore(*start_input)
+
+    game = game_class()
+    random.seed(seed)
+    #timers add up floats, so start the clock where it was to get them firing on exactly the same updates
+    g.timers.time = clock_time
+    game.run()
+    if first_update_dt:
+        main.update_after_timers(first_update_dt)
+
+    frames = 0
+    updates = 0
+    divergences = []
+    for record in records:
+        if record[0] == "events":
+            #draw the frame before this one (including the frame the game started in)
+            if frames or updates:
+                main.draw()
+            for event in record[1]:
+                pygame.event.post(event)
+            main.handle_input()
+            bindings.invalidate()
+            frames += 1
+
+        else:
+            count, dt, timers_fired = record[1:]
+            for index in range(count):
+                fired = g.timers.fired
+                main.update(dt)
+                if g.timers.fired-fired != timers_fired:
+                    divergences.append(updates)
+                updates += 1
+    main.draw()
+
+    elapsed = time.perf_counter()-start
+
+    #the recording may stop before the game's post time is up
+    if game is g.current_game:
+        game.end()
+
+    return {
+        "game":key,
+        "frames":frames,
+        "updates":updates,
+        "divergences":divergences,
+        "replay_ms":elapsed*1000,
+        "recorded_ms":sum(record[1]*record[2] for record in records if record[0] == "updates"),
+    }
+
+if __name__ == "__main__":
+    #run without a window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    import main
+
+    if len(sys.argv) < 2:
+        print("usage: python recording.py <recording files>")
+        sys.exit(2)
+
+    pygame.init()
+    main.setup()
+
+    failed = 0
+    start = time.perf_counter()
+    for path in sys.argv[1:]:
+        stats = replay(path)
+        print(f"{path}: {stats['game']} {stats['frames']} frames, {stats['updates']} updates, "
+              f"{stats['recorded_ms']/1000:.1f}s of play replayed in {stats['replay_ms']:.1f}ms, {len(stats['divergences'])} divergences")
+        if stats["divergences"]:
+            failed += 1
+    print(f"{len(sys.argv)-1} recordings in {time.perf_counter()-start:.2f}s, {failed} diverged")
+
+    sys.exit(1 if failed else 0)
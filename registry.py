@@ -0,0 +1,186 @@
+"""
+This is a file for finding microgames.
+Microgame modules in a directory are read (not imported) to find their classes and class-level metadata,
+and what was found is kept in a manifest on disk, so only files that changed are read again.
+A module is only imported once one of its games is actually needed
+"""
+import os
+import sys
+import ast
+import json
+import inspect
+import importlib
+import global_values as g
+
+def get_default_metadata():
+    import microgame
+    return microgame.Microgame.metadata
+
+def find_games(source):
+    """
+    Find the microgame classes in some source code, as a list of (class name, class-level metadata).
+    Classes are counted as microgames if they inherit from Microgame, or from another microgame in the same file
+    """
+    tree = ast.parse(source)
+
+    #class name -> metadata, for microgames found so far
+    games = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        metadata = None
+        for base in node.bases:
+            if isinstance(base, ast.Name):
+                base_name = base.id
+            elif isinstance(base, ast.Attribute):
+                base_name = base.attr
+            else:
+                continue
+
+            if base_name == "Microgame":
+                metadata = {}
+            elif base_name in games:
+                metadata = dict(games[base_name])
+        if metadata is None:
+            continue
+
+        for statement in node.body:
+            if isinstance(statement, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "metadata" for target in statement.targets):
+                try:
+                    metadata.update(ast.literal_eval(statement.value))
+                except ValueError:
+                    #not plain values, we'll have to import the game to know
+                    pass
+
+        games[node.name] = metadata
+
+    return list(games.items())
+
+class GameEntry:
+    """
+    A microgame that has been found, but not necessarily imported
+    """
+    def __init__(self, module_name, class_name, path, mtime, metadata):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.path = path
+        self.mtime = mtime
+
+        self.metadata = dict(get_default_metadata())
+        self.metadata.update(metadata)
+
+        #the name this game is known by, e.g. for caching thumbnails
+        self.key = f"{module_name}.{class_name}"
+
+        self.game_class = None
+
+    def load(self):
+        """
+        Import the game's module (if it hasn't been already) and get the game class
+        """
+        if self.game_class is None:
+            module = importlib.import_module(self.module_name)
+            self.game_class = getattr(module, self.class_name)
+        return self.game_class
+
+def get_entry(game_class):
+    """
+    Get an entry for a game class that has already been imported
+    """
+    try:
+        path = inspect.getsourcefile(game_class)
+        mtime = os.path.getmtime(path)
+    except (TypeError, OSError):
+        path = None
+        mtime = 0
+
+    entry = GameEntry(game_class.__module__, game_class.__qualname__, path, mtime, game_class.metadata)
+    entry.game_class = game_class
+    return entry
+
+class Registry:
+    """
+    Finds microgames in a directory, keeping a manifest of what's in each file so unchanged files aren't read again
+    """
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = g.GAMES_DIR
+        self.directory = directory
+
+        #key -> GameEntry, kept between calls to discover so imported classes are remembered
+        self.entries = {}
+
+        self.manifest_path = os.path.join(g.CACHE_DIR, "registry.json")
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get("directory") != os.path.abspath(self.directory):
+            return {}
+        return manifest["files"]
+
+    def save_manifest(self, files):
+        os.makedirs(g.CACHE_DIR, exist_ok=True)
+        with open(self.manifest_path, "w") as f:
+            json.dump({"directory":os.path.abspath(self.directory), "files":files}, f)
+
+    def discover(self):
+        """
+        Get every microgame in the directory, sorted by key
+        """
+        #so the modules can be imported later
+        directory = os.path.abspath(self.directory)
+        if directory not in sys.path:
+            sys.path.append(directory)
+
+        old_files = self.load_manifest()
+        files = {}
+        changed = False
+
+        with os.scandir(self.directory) as scan:
+            for dir_entry in scan:
+                if not dir_entry.name.endswith(".py") or not dir_entry.is_file():
+                    continue
+
+                mtime = dir_entry.stat().st_mtime
+                file_info = old_files.get(dir_entry.name)
+                if file_info is None or file_info["mtime"] != mtime:
+                    with open(dir_entry.path, encoding="utf-8") as f:
+                        source = f.read()
+
+                    games = []
+                    #quick check before parsing
+                    if "Microgame" in source:
+                        try:
+                            games = find_games(source)
+                        except SyntaxError:
+                            pass
+
+                    file_info = {"mtime":mtime, "games":games}
+                    changed = True
+
+                files[dir_entry.name] = file_info
+
+        if changed or files.keys() != old_files.keys():
+            self.save_manifest(files)
+
+        entries = {}
+        for file_name, file_info in files.items():
+            module_name = file_name[:-3]
+            for class_name, metadata in file_info["games"]:
+                key = f"{module_name}.{class_name}"
+                entry = self.entries.get(key)
+                if entry is None or entry.mtime != file_info["mtime"]:
+                    entry = GameEntry(module_name, class_name, os.path.join(self.directory, file_name), file_info["mtime"], metadata)
+                entries[key] = entry
+
+        self.entries = entries
+        return [entries[key] for key in sorted(entries)]
+
+#the registry main.py uses
+registry = Registry()
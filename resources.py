@@ -0,0 +1,78 @@
+"""
+This is a file for keeping track of the memory microgames are using.
+Microgames are added when they load their resources (see Microgame.load) and removed when they unload them.
+If the total goes over g.MEMORY_BUDGET, the games that have been idle longest are unloaded until it isn't
+"""
+from collections import OrderedDict
+import global_values as g
+
+def get_surface_bytes(surf):
+    return surf.get_pitch()*surf.get_height()
+
+class ResourceTracker:
+    """
+    Keeps track of the loaded microgames and how much memory each is using, least recently used first
+    """
+    def __init__(self):
+        #microgame -> bytes it is using
+        self.loaded = OrderedDict()
+        #how many games have been unloaded to stay under the budget
+        self.evictions = 0
+
+    def add(self, game):
+        """
+        Start tracking a game that has just loaded, unloading idle games if that puts us over budget
+        """
+        self.loaded[game] = game.get_memory_usage()
+        self.loaded.move_to_end(game)
+        self.enforce_budget()
+
+    def touch(self, game):
+        """
+        Mark a game as just used, and update how much memory it is using
+        """
+        if game in self.loaded:
+            self.loaded[game] = game.get_memory_usage()
+            self.loaded.move_to_end(game)
+
+    def remove(self, game):
+        self.loaded.pop(game, None)
+
+    def get_total(self):
+        return sum(self.loaded.values())
+
+    def enforce_budget(self):
+        """
+        Unload idle games, least recently used first, until the total is under budget.
+        Running games are never unloaded
+        """
+        if g.MEMORY_BUDGET is None:
+            return
+
+        total = self.get_total()
+        for game in list(self.loaded):
+            if total <= g.MEMORY_BUDGET:
+                break
+            if game.running:
+                continue
+            total -= self.loaded[game]
+            game.unload()
+            self.evictions += 1
+
+    def get_stats(self):
+        """
+        Get how much memory is being used by loaded games, and by what's cached for them
+        """
+        import asset_manager
+        import surfaces
+
+        return {
+            "loaded_games":len(self.loaded),
+            "game_bytes":self.get_total(),
+            "asset_bytes":asset_manager.manager.get_memory_usage(),
+            "pooled_surface_bytes":surfaces.pool.get_memory_usage(),
+            "evictions":self.evictions,
+        }
+
+#the tracker everything shares
+tracker = ResourceTracker()
@@ -0,0 +1,175 @@
+"""
+This is a file for runner mode, which plays a shuffled stream of microgames back to back.
+While one microgame plays, the next one is built and prepared on a worker thread,
+so moving from one to the next doesn't have to wait for anything
+"""
+import time
+import random
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import global_values as g
+import recording
+
+def build_game(game_entry):
+    """
+    Import, make and prepare a microgame. This runs on the worker thread
+    """
+    game = game_entry.load()()
+    game.prepare()
+    return game
+
+def discard_game(future):
+    """
+    Unload a microgame that was built (or was being built) but won't be played, so its preloaded assets are let go
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().unload()
+
+class Runner:
+    """
+    Plays microgames one after another, with the next one always being built in the background
+    """
+    def __init__(self, frame_budget=1000/60):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="runner")
+
+        self.active = False
+        #the games to play, as registry.GameEntry
+        self.games = []
+        #the shuffled order games are being played in
+        self.queue = []
+
+        #Future for the next microgame, and the registry.GameEntry it is being built from
+        self.next_game = None
+        self.next_entry = None
+        #whether the next microgame has been loaded on the main thread
+        self.next_game_ready = False
+
+        #how long each transition between microgames took (ms), and how long a frame is allowed to take
+        self.stalls = []
+        self.frame_budget = frame_budget
+        #(registry key, exception) for each microgame that couldn't be built
+        self.failures = []
+
+    def start(self, games):
+        """
+        Start playing a stream of microgames, from a list of registry.GameEntry.
+        Does nothing if the runner is already going
+        """
+        if self.active:
+            return
+
+        self.active = True
+        self.games = list(games)
+        self.queue = []
+        self.stalls = []
+        self.failures = []
+        self.prefetch()
+
+    def stop(self):
+        """
+        Stop after the current microgame, returning the stats for the run (see get_stats)
+        """
+        if not self.active:
+            return None
+        self.active = False
+
+        if self.next_game is not None:
+            #if it's still being built, it's unloaded once it's done
+            if not self.next_game.cancel():
+                self.next_game.add_done_callback(discard_game)
+            self.next_game = None
+            self.next_entry = None
+
+        return self.get_stats()
+
+    def get_next_entry(self):
+        if not self.queue:
+            self.queue = self.games[:]
+            random.shuffle(self.queue)
+        return self.queue.pop()
+
+    def prefetch(self):
+        """
+        Start building the next microgame in the background
+        """
+        self.next_entry = self.get_next_entry()
+        self.next_game = self.executor.submit(build_game, self.next_entry)
+        self.next_game_ready = False
+
+    def get_built_game(self):
+        """
+        Get the next microgame, waiting for it to be built if it isn't yet.
+        If building it failed, the error is reported, another game is started building instead, and None is returned
+        """
+        try:
+            return self.next_game.result()
+        except Exception as error:
+            print(f"runner: couldn't build {self.next_entry.key}, skipping it")
+            traceback.print_exception(error)
+            self.failures.append((self.next_entry.key, error))
+            self.prefetch()
+            return None
+
+    def update(self):
+        """
+        Called every frame. Once the next microgame has been built, load it on the main thread,
+        so that none of it has to happen when it starts.
+        Also starts the first microgame once it's ready
+        """
+        if not self.active or self.next_game is None or not self.next_game.done():
+            return
+
+        if not self.next_game_ready:
+            game = self.get_built_game()
+            if game is None:
+                return
+            game.load()
+            self.next_game_ready = True
+
+        if g.current_game is None:
+            self.start_next()
+
+    def start_next(self):
+        """
+        Run the next microgame, waiting for it to be built if it isn't yet. This is called when the previous one ends
+        """
+        if not self.active:
+            return
+
+        start = time.perf_counter()
+
+        #skip any that fail to build, but give up if none of them can be
+        game = None
+        for attempt in range(len(self.games)):
+            game = self.get_built_game()
+            if game is not None:
+                break
+        if game is None:
+            print("runner: no microgames could be built, stopping")
+            self.stop()
+            return
+
+        game.load()
+        recording.begin(game)
+        game.run()
+
+        self.stalls.append((time.perf_counter()-start)*1000)
+
+        self.prefetch()
+
+    def get_stats(self):
+        """
+        Get how long transitions between microgames took
+        """
+        if not self.stalls:
+            return {"transitions":0, "failures":len(self.failures)}
+        return {
+            "transitions":len(self.stalls),
+            "failures":len(self.failures),
+            "mean_ms":sum(self.stalls)/len(self.stalls),
+            "max_ms":max(self.stalls),
+            "over_budget":sum(1 for stall in self.stalls if stall > self.frame_budget),
+        }
+
+#the runner main.py uses
+runner = Runner()
@@ -0,0 +1,193 @@
+"""
+This is a file for smoke testing every microgame, so new submissions don't have to be checked by hand first.
+Each game is run headless in a pool of worker processes (one per core by default):
+    python smoke.py [--frames N] [--output report.json]
+Every game is played twice with scripted input, once ending in a win and once in a loss, going through
+run, some frames of handle_input/update/draw, win/lose, and then frames until it ends.
+Crashes, controls left behind, peak memory and frame times are collected into one report.
+Memory is reported three ways: how much the worker process grew (which sees everything, SDL surfaces included,
+but isn't available on Windows), the game's own count of its surfaces and assets (Microgame.get_memory_usage),
+and the peak of Python's own allocations
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import traceback
+import tracemalloc
+import multiprocessing
+try:
+    import resource
+except ImportError:
+    #not on Windows
+    resource = None
+
+#SDL turns SIGTERM into a QUIT event, which would stop the pool from shutting its workers down
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+
+import benchmarks
+import pygame
+import global_values as g
+
+def get_peak_rss():
+    """
+    Get the most memory (bytes) this process has used so far, or None if we can't tell
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes everywhere but macOS
+    return peak if sys.platform == "darwin" else peak*1024
+
+def init_worker():
+    benchmarks.init_headless()
+
+    import main
+    main.register_event_handlers()
+
+def play(game_class, outcome, frames, dt, memory=None):
+    """
+    Play a game through to its end, returning the frame times (ms).
+    If memory is given, memory["game_bytes"] is kept at the most the game said it was using
+    """
+    import main
+
+    random.seed(0)
+    game = game_class()
+    game.run()
+
+    times = []
+    def run_frame(frame):
+        for event in benchmarks.get_default_script(frame):
+            pygame.event.post(event)
+        start = time.perf_counter()
+        main.run_frame(dt)
+        times.append((time.perf_counter()-start)*1000)
+        if memory is not None and game.running:
+            memory["game_bytes"] = max(memory.get("game_bytes", 0), game.get_memory_usage())
+
+    frame = 0
+    while frame < frames and not game.ended:
+        run_frame(frame)
+        frame += 1
+
+    if not game.ended:
+        if outcome == "win":
+            game.win()
+        else:
+            game.lose()
+
+    #play until the post time is up and the game ends
+    end_frame = frame + int((game.metadata["post_time"]*1000 + 1000)/dt)
+    while frame < end_frame and game.running:
+        run_frame(frame)
+        frame += 1
+
+    if game.running:
+        game.end()
+        raise RuntimeError(f"didn't end within {game.metadata['post_time']}s of finishing")
+
+    return times
+
+def check_game(key, frames=300, dt=16):
+    """
+    Smoke test one game, from its registry key. This runs in a worker process
+    """
+    report = {"game":key, "errors":[]}
+    rss_before = get_peak_rss()
+    memory = {}
+
+    try:
+        game_class = benchmarks.load_game_class(key)
+    except Exception:
+        report["errors"].append({"phase":"import", "traceback":traceback.format_exc()})
+        return report
+
+    for outcome in ("win", "lose"):
+        controls_before = set(g.controls)
+        crashed = False
+
+        #frame times from the first play, memory from the second, as tracing allocations slows everything down
+        traced = outcome == "lose"
+        if traced:
+            tracemalloc.start()
+        try:
+            times = play(game_class, outcome, frames, dt, memory)
+            if not traced:
+                report["frame_ms"] = benchmarks.get_stats(times) if times else None
+        except Exception:
+            report["errors"].append({"phase":outcome, "traceback":traceback.format_exc()})
+            crashed = True
+            if g.current_game:
+                g.current_game.end()
+        finally:
+            if traced:
+                report["peak_python_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        leaked = [control for control in g.controls if control not in controls_before]
+        #a game that crashed won't have cleaned up, so only count leaks from games that didn't
+        if leaked and not crashed:
+            report["errors"].append({"phase":outcome, "leaked_controls":[type(control).__name__ for control in leaked]})
+        #so the next game's numbers aren't thrown off
+        for control in leaked:
+            control.delete()
+
+    report["game_memory_bytes"] = memory.get("game_bytes")
+    #the peak only goes up, so this is how much more the worker needed for this game than for any before it
+    rss_after = get_peak_rss()
+    report["peak_rss_bytes"] = rss_after
+    report["rss_growth_bytes"] = rss_after-rss_before if rss_after is not None else None
+    return report
+
+def get_kb_text(size):
+    return f"{size/1024:8.1f}KB" if size is not None else f"{'-':>10}"
+
+def print_report(reports):
+    for report in reports:
+        frame_ms = report.get("frame_ms")
+        if frame_ms:
+            frame_text = f"frame mean {frame_ms['mean']:7.3f}ms p99 {frame_ms['p99']:7.3f}ms"
+        else:
+            frame_text = "frame -"
+        memory_text = "  ".join(f"{name} {get_kb_text(report.get(field))}" for name, field in
+                                (("rss +", "rss_growth_bytes"), ("game", "game_memory_bytes"), ("python", "peak_python_bytes")))
+        status = "FAIL" if report["errors"] else "ok"
+        print(f"{status:<4} {report['game']:<40} {frame_text}  {memory_text}")
+
+        for error in report["errors"]:
+            if "traceback" in error:
+                print(f"    crashed during {error['phase']}:")
+                print("".join(f"        {line}\n" for line in error["traceback"].splitlines()), end="")
+            else:
+                print(f"    left {len(error['leaked_controls'])} controls behind after {error['phase']}: {', '.join(error['leaked_controls'])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smoke test every microgame headless")
+    parser.add_argument("--frames", type=int, default=300, help="most frames to play before winning/losing")
+    parser.add_argument("--dt", type=int, default=16, help="milliseconds each frame takes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes to use")
+    parser.add_argument("--output", help="file to write the report to as JSON")
+    parser.add_argument("--directory", default=g.GAMES_DIR, help="where to look for microgames")
+    args = parser.parse_args()
+
+    from registry import Registry
+    keys = [entry.key for entry in Registry(args.directory).discover()]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes, initializer=init_worker) as pool:
+        reports = pool.starmap(check_game, [(key, args.frames, args.dt) for key in keys], chunksize=1)
+        pool.close()
+        pool.join()
+
+    print_report(reports)
+    failed = sum(1 for report in reports if report["errors"])
+    print(f"{len(reports)} games checked in {time.perf_counter()-start:.2f}s with {args.processes} processes, {failed} failed")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,181 @@
+"""
+This is a file for drawing microgames in layers, rather than with lots of separate draw calls every frame.
+    StaticLayer - something drawn once (like a background) and kept, only drawn again when invalidated
+    SpriteLayer - images that move about, all drawn in one Surface.blits call
+    LayerStack - layers drawn one on top of another
+For example, in run:
+    self.layers = sprites.LayerStack([sprites.StaticLayer(self.surf.get_size(), self.draw_background), sprites.SpriteLayer()])
+    self.player = self.layers[1].add(self.get_asset("player"), (0, 0))
+and in draw:
+    self.player.pos = (x, y)
+    return self.layers.draw(self.surf)
+Layers hold on to surfaces, so call release() on them in unload
+"""
+import pygame
+import surfaces
+import resources
+
+class StaticLayer:
+    """
+    Something that doesn't change often, drawn once onto its own surface by draw_function(surf) and kept.
+    Call invalidate when it needs drawing again
+    """
+    def __init__(self, size, draw_function, transparent=False, pos=(0,0)):
+        self.size = size
+        self.draw_function = draw_function
+        self.flags = pygame.SRCALPHA if transparent else 0
+        self.pos = pos
+
+        #the drawn layer, made from the surface pool when first needed
+        self.surf = None
+        self.valid = False
+        #how many times this has been drawn, to check it isn't happening every frame
+        self.renders = 0
+
+    def invalidate(self):
+        self.valid = False
+
+    def render(self):
+        if self.surf is None:
+            self.surf = surfaces.pool.acquire(self.size, self.flags)
+        elif self.flags:
+            self.surf.fill((0,0,0,0))
+
+        self.draw_function(self.surf)
+        self.valid = True
+        self.renders += 1
+
+    def draw(self, target):
+        if not self.valid:
+            self.render()
+        target.blit(self.surf, self.pos)
+
+    def release(self):
+        """
+        Give the surface back to the pool. It will be drawn again next time this layer is drawn
+        """
+        if self.surf is not None:
+            surfaces.pool.release(self.surf)
+        self.surf = None
+        self.valid = False
+
+    def get_memory_usage(self):
+        return resources.get_surface_bytes(self.surf) if self.surf is not None else 0
+
+class Sprite:
+    """
+    An image in a SpriteLayer. Change image, pos and visible whenever, it's picked up next time the layer is drawn
+    """
+    __slots__ = ("layer", "entry", "_visible")
+
+    def __init__(self, layer, image, pos):
+        self.layer = layer
+        #[image, pos], what's handed straight to Surface.blits
+        self.entry = [image, pos]
+        self._visible = True
+
+    @property
+    def image(self):
+        return self.entry[0]
+
+    @image.setter
+    def image(self, image):
+        self.entry[0] = image
+
+    @property
+    def pos(self):
+        return self.entry[1]
+
+    @pos.setter
+    def pos(self, pos):
+        self.entry[1] = pos
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible):
+        if visible != self._visible:
+            self._visible = visible
+            self.layer.update_sequence()
+
+    def kill(self):
+        """
+        Take this sprite out of its layer
+        """
+        self.visible = False
+        self.layer.sprites.remove(self)
+
+class SpriteLayer:
+    """
+    Images that move about, drawn in the order they were added.
+    The layer keeps the list Surface.blits is given, so drawing doesn't go through the sprites one at a time
+    """
+    def __init__(self):
+        self.sprites = []
+        #entries of the visible sprites, in the order they're drawn
+        self.sequence = []
+
+    def add(self, image, pos=(0,0)):
+        sprite = Sprite(self, image, pos)
+        self.sprites.append(sprite)
+        self.sequence.append(sprite.entry)
+        return sprite
+
+    def update_sequence(self):
+        """
+        Get the entries of the visible sprites again, after one is shown or hidden.
+        Sprites with the same image and pos have equal entries, so this goes through the sprites rather than searching
+        the sequence, which also keeps them in the order they were added
+        """
+        self.sequence[:] = [sprite.entry for sprite in self.sprites if sprite.visible]
+
+    def clear(self):
+        self.sprites.clear()
+        self.sequence.clear()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def draw(self, target):
+        if self.sequence:
+            target.blits(self.sequence, doreturn=False)
+
+    def release(self):
+        pass
+
+    def get_memory_usage(self):
+        return 0
+
+class LayerStack:
+    """
+    Layers drawn in order, the first at the bottom
+    """
+    def __init__(self, layers=()):
+        self.layers = list(layers)
+
+    def add(self, layer):
+        self.layers.append(layer)
+        return layer
+
+    def __getitem__(self, index):
+        return self.layers[index]
+
+    def __len__(self):
+        return len(self.layers)
+
+    def draw(self, target):
+        """
+        Draw every layer onto target, and return it
+        """
+        for layer in self.layers:
+            layer.draw(target)
+        return target
+
+    def release(self):
+        for layer in self.layers:
+            layer.release()
+
+    def get_memory_usage(self):
+        return sum(layer.get_memory_usage() for layer in self.layers)
@@ -0,0 +1,61 @@
+"""
+This is a file for reusing surfaces.
+Making a surface means allocating and clearing its pixels, so surfaces that are only needed while a microgame runs
+are taken from a pool when it starts and given back when it ends
+"""
+import pygame
+import resources
+
+class SurfacePool:
+    """
+    Free surfaces, keyed by size and format
+    """
+    def __init__(self, max_per_key=4):
+        #(width, height, flags, bit depth) -> list of free surfaces
+        self.free = {}
+        #how many free surfaces to keep of each size and format
+        self.max_per_key = max_per_key
+
+    def get_key(self, size, flags, depth):
+        #only the flags that change the pixel format matter
+        return (size[0], size[1], flags & pygame.SRCALPHA, depth)
+
+    def acquire(self, size, flags=0):
+        """
+        Get a cleared surface, reusing a free one if there is one
+        """
+        depth = 32 if flags & pygame.SRCALPHA else 0
+        free = self.free.get(self.get_key(size, flags, depth))
+        if free:
+            surf = free.pop()
+            surf.fill((0,0,0,0))
+            return surf
+
+        if depth:
+            return pygame.Surface(size, flags, depth)
+        return pygame.Surface(size, flags)
+
+    def release(self, surf):
+        """
+        Give a surface back so it can be reused. Don't use it after this
+        """
+        flags = surf.get_flags()
+        depth = 32 if flags & pygame.SRCALPHA else 0
+        free = self.free.setdefault(self.get_key(surf.get_size(), flags, depth), [])
+        if len(free) < self.max_per_key:
+            free.append(surf)
+
+    def get_memory_usage(self):
+        """
+        Get how many bytes of pixels the free surfaces take up
+        """
+        return sum(resources.get_surface_bytes(surf) for free in self.free.values() for surf in free)
+
+    def clear(self):
+        """
+        Drop every free surface
+        """
+        self.free.clear()
+
+#the pool everything shares
+pool = SurfacePool()
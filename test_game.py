@@ -1,12 +1,16 @@
 import pygame
 import os
 import global_values as g
+import sprites
 
 from microgame import Microgame
 
 class TestGame(Microgame):
-    def __init__(self):
-        super().__init__({"time":8, "show_cursor":False})
+    metadata = {"time":8, "show_cursor":False}
+    asset_paths = {"reticule":os.path.join("assets","reticule.png")}
+
+    #made in run
+    layers = None
 
     def run(self):
         import random
@@ -16,10 +20,25 @@ class TestGame(Microgame):
         self.target_x = random.randint(0, self.metadata["width"])
         self.target_y = random.randint(0, self.metadata["height"])
 
-        self.reticule = pygame.image.load( os.path.join("assets","reticule.png") )
+        self.reticule = self.get_asset("reticule")
+
+        #the target doesn't move, so it's only drawn once, and the reticule is drawn on top
+        self.layers = sprites.LayerStack([sprites.StaticLayer(self.surf.get_size(), self.draw_background), sprites.SpriteLayer()])
+        self.reticule_sprite = self.layers[1].add(self.reticule)
 
         super().run()
 
+    def unload(self):
+        if self.layers is not None:
+            self.layers.release()
+        super().unload()
+
+    def get_memory_usage(self):
+        usage = super().get_memory_usage()
+        if self.layers is not None:
+            usage += self.layers.get_memory_usage()
+        return usage
+
     
     def handle_input(self, event_list):
         #check if we have clicked to fire
@@ -41,8 +60,8 @@ class TestGame(Microgame):
         if dist <= self.target_width:
             self.win()
 
-    def draw(self):
-        self.surf.fill("gray")
+    def draw_background(self, surf):
+        surf.fill("gray")
 
         #draw target
         circle_width = 4
@@ -52,11 +71,12 @@ class TestGame(Microgame):
             else:
                 color = "white"
 
-            pygame.draw.circle(self.surf, color, (self.target_x, self.target_y), circle_width*i, circle_width)
-        pygame.draw.circle(self.surf, "black", (self.target_x, self.target_y), self.target_width, 1)
+            pygame.draw.circle(surf, color, (self.target_x, self.target_y), circle_width*i, circle_width)
+        pygame.draw.circle(surf, "black", (self.target_x, self.target_y), self.target_width, 1)
 
+    def draw(self):
         mx, my = self.get_mouse_pos()
         reticule_size = 8
-        self.surf.blit(self.reticule, (mx-(reticule_size/2), my-(reticule_size/2)))
+        self.reticule_sprite.pos = (mx-(reticule_size/2), my-(reticule_size/2))
 
-        return self.surf
\ No newline at end of file
+        return self.layers.draw(self.surf)
\ No newline at end of file
@@ -5,8 +5,7 @@ import global_values as g
 from microgame import Microgame
 
 class TestGame2(Microgame):
-    def __init__(self):
-        super().__init__({"time":5, "show_cursor":True})
+    metadata = {"time":5, "show_cursor":True}
 
     def run(self):
         import random
@@ -0,0 +1,129 @@
+"""
+This is a file for drawing the frames controls sit in (like button backgrounds), and sharing them between controls.
+Each style is drawn once as a small tile, along with its highlighted and pressed versions, and nine-sliced up to
+whatever size is needed. Frames are cached by size and style, so controls that look the same share the same surfaces
+"""
+import weakref
+import pygame
+
+class Theme:
+    """
+    Caches of frames and labels
+    """
+    def __init__(self, darkening=(64,64,64)):
+        #how much darker highlighted frames are (and pressed ones are twice that)
+        self.darkening = darkening
+
+        #style -> (normal, highlighted, pressed) tiles
+        self.tiles = {}
+        #(size, style) -> (normal, highlighted, pressed) frames
+        self.frames = {}
+        #font -> {(text, color): label parts}
+        self.labels = weakref.WeakKeyDictionary()
+
+    def get_style(self, background_color, border_color, border_width, border_radius):
+        return (tuple(pygame.Color(background_color)), tuple(pygame.Color(border_color)), border_width, border_radius)
+
+    def get_corner_size(self, style):
+        #the corners have to fit the rounded part and the border
+        return max(style[2], style[3])
+
+    def draw_frame(self, size, style):
+        background_color, border_color, border_width, border_radius = style
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        surf.fill((0,0,0,0))
+        rect = surf.get_rect()
+        pygame.draw.rect(surf, background_color, rect, border_radius=border_radius)
+        pygame.draw.rect(surf, border_color, rect, width=border_width, border_radius=border_radius)
+        return surf
+
+    def get_variants(self, surf):
+        """
+        Get a frame along with its highlighted and pressed versions
+        """
+        darkening_surf = pygame.Surface(surf.get_size())
+        darkening_surf.fill(self.darkening)
+
+        highlighted = surf.copy()
+        highlighted.blit(darkening_surf, (0,0), special_flags=pygame.BLEND_SUB)
+        pressed = highlighted.copy()
+        pressed.blit(darkening_surf, (0,0), special_flags=pygame.BLEND_SUB)
+        return surf, highlighted, pressed
+
+    def get_tiles(self, style):
+        tiles = self.tiles.get(style)
+        if tiles is None:
+            corner = self.get_corner_size(style)
+            tiles = self.get_variants(self.draw_frame((corner*2 + 1, corner*2 + 1), style))
+            self.tiles[style] = tiles
+        return tiles
+
+    def nine_slice(self, tile, size, corner):
+        """
+        Stretch a tile to a size, keeping the corners as they are.
+        The tile is (corner*2 + 1) square, its middle row and column are stretched to fill the edges and centre
+        """
+        width, height = size
+        middle_width = width - (corner*2)
+        middle_height = height - (corner*2)
+        far = corner + 1
+
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        surf.fill((0,0,0,0))
+
+        #corners
+        surf.blit(tile, (0, 0), (0, 0, corner, corner))
+        surf.blit(tile, (width-corner, 0), (far, 0, corner, corner))
+        surf.blit(tile, (0, height-corner), (0, far, corner, corner))
+        surf.blit(tile, (width-corner, height-corner), (far, far, corner, corner))
+
+        #edges
+        surf.blit(pygame.transform.scale(tile.subsurface((corner, 0, 1, corner)), (middle_width, corner)), (corner, 0))
+        surf.blit(pygame.transform.scale(tile.subsurface((corner, far, 1, corner)), (middle_width, corner)), (corner, height-corner))
+        surf.blit(pygame.transform.scale(tile.subsurface((0, corner, corner, 1)), (corner, middle_height)), (0, corner))
+        surf.blit(pygame.transform.scale(tile.subsurface((far, corner, corner, 1)), (corner, middle_height)), (width-corner, corner))
+
+        #centre
+        surf.fill(tile.get_at((corner, corner)), (corner, corner, middle_width, middle_height))
+        return surf
+
+    def get_frames(self, size, background_color, border_color="gray", border_width=32, border_radius=32):
+        """
+        Get the (normal, highlighted, pressed) frames for a size and style. These are shared, so don't draw on them
+        """
+        style = self.get_style(background_color, border_color, border_width, border_radius)
+        key = (tuple(size), style)
+
+        frames = self.frames.get(key)
+        if frames is None:
+            corner = self.get_corner_size(style)
+            if size[0] > corner*2 and size[1] > corner*2:
+                frames = tuple(self.nine_slice(tile, size, corner) for tile in self.get_tiles(style))
+            else:
+                #too small to slice
+                frames = self.get_variants(self.draw_frame(size, style))
+            self.frames[key] = frames
+        return frames
+
+    def get_label(self, font, text, color="black", shadow_offset=1, shadow_alpha=128):
+        """
+        Get some text with a faint shadow, rendered once per font, text and colour.
+        This is a list of (surface, offset) to blit in order, the text and then its shadow. They're blitted separately
+        rather than combined into one surface, as going through a transparent surface changes how they blend.
+        These are shared, so don't draw on them
+        """
+        font_labels = self.labels.setdefault(font, {})
+        key = (text, tuple(pygame.Color(color)))
+
+        label = font_labels.get(key)
+        if label is None:
+            text_surf = font.render(text, True, color)
+            shadow_surf = font.render(text, True, "black")
+            shadow_surf.set_alpha(shadow_alpha)
+
+            label = [(text_surf, (0, 0)), (shadow_surf, (shadow_offset, shadow_offset))]
+            font_labels[key] = label
+        return label
+
+#the theme everything shares
+theme = Theme()
@@ -0,0 +1,167 @@
+"""
+This is a file for making and caching microgame thumbnails.
+Thumbnails are only made when they are needed, packed into one atlas surface
+and saved to disk, so later launches don't have to build every game to show the gallery.
+"""
+import os
+import json
+import pygame
+import global_values as g
+
+#atlases that have been made, keyed by thumbnail size
+atlases = {}
+
+def get_atlas(thumbnail_width, thumbnail_height):
+    """
+    Get the shared atlas for thumbnails of a given size, loading it from disk if we can
+    """
+    key = (thumbnail_width, thumbnail_height)
+    if key not in atlases:
+        atlases[key] = ThumbnailAtlas(thumbnail_width, thumbnail_height)
+    return atlases[key]
+
+def save_all():
+    """
+    Save every atlas that has changed since it was loaded
+    """
+    for atlas in atlases.values():
+        atlas.save()
+
+class ThumbnailAtlas:
+    """
+    One surface holding many thumbnails of the same size, in a grid of slots
+    """
+    def __init__(self, thumbnail_width, thumbnail_height, columns=16, save_delay=2000):
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_height = thumbnail_height
+        self.columns = columns
+        #how long (ms, real time) after a thumbnail is made the atlas is saved, so a batch of them is saved together
+        self.save_delay = save_delay
+
+        #game key (see registry.GameEntry) -> {"slot":slot index, "mtime":source modification time}
+        self.entries = {}
+        self.surf = None
+        self.rows = 0
+
+        #whether we have anything that isn't on disk yet, and when (pygame.time.get_ticks) it first wasn't
+        self.dirty = False
+        self.dirty_time = None
+
+        name = f"thumbnails_{thumbnail_width}x{thumbnail_height}"
+        self.image_path = os.path.join(g.CACHE_DIR, name+".png")
+        self.index_path = os.path.join(g.CACHE_DIR, name+".json")
+
+        self.load()
+
+    def load(self):
+        """
+        Load the atlas from disk. If anything is missing or doesn't match, start empty
+        """
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index["columns"] != self.columns:
+                return
+            surf = pygame.image.load(self.image_path)
+        except (OSError, ValueError, KeyError, pygame.error):
+            return
+
+        if surf.get_width() != self.columns*self.thumbnail_width or surf.get_height() % self.thumbnail_height:
+            return
+
+        self.surf = surf
+        self.rows = surf.get_height() // self.thumbnail_height
+        self.entries = index["entries"]
+        self.convert()
+
+    def convert(self):
+        """
+        Convert the atlas surface to the display's pixel format, so the gallery can blit from it quickly.
+        Does nothing until there is a display
+        """
+        if self.surf is not None and pygame.display.get_surface() is not None:
+            self.surf = self.surf.convert_alpha()
+
+    def save(self):
+        """
+        Save the atlas to disk if it has changed
+        """
+        self.dirty_time = None
+        if not self.dirty or self.surf is None:
+            return
+
+        os.makedirs(g.CACHE_DIR, exist_ok=True)
+        pygame.image.save(self.surf, self.image_path)
+        with open(self.index_path, "w") as f:
+            json.dump({"columns":self.columns, "entries":self.entries}, f)
+
+        self.dirty = False
+
+    def save_if_due(self):
+        """
+        Save the atlas if thumbnails were made at least save_delay ago, rather than only when leaving the gallery,
+        so nothing is lost if we're killed. This is on the real clock rather than g.timers, so it can't go off in a microgame
+        """
+        if self.dirty_time is not None and pygame.time.get_ticks()-self.dirty_time >= self.save_delay:
+            self.save()
+
+    def get_area(self, slot):
+        """
+        Get the part of the atlas surface used by a slot
+        """
+        x = (slot % self.columns) * self.thumbnail_width
+        y = (slot // self.columns) * self.thumbnail_height
+        return pygame.Rect(x, y, self.thumbnail_width, self.thumbnail_height)
+
+    def grow(self, rows):
+        """
+        Make sure the atlas surface has at least a certain number of rows
+        """
+        if rows <= self.rows:
+            return
+
+        rows = max(rows, self.rows*2, 4)
+        surf = pygame.Surface((self.columns*self.thumbnail_width, rows*self.thumbnail_height), pygame.SRCALPHA)
+        surf.fill((0,0,0,0))
+        if self.surf:
+            surf.blit(self.surf, (0,0))
+
+        self.surf = surf
+        self.rows = rows
+        self.convert()
+
+    def get(self, game, create=True):
+        """
+        Get the area of the atlas holding the thumbnail for a game (a registry.GameEntry).
+        If it isn't there (or is out of date) and create is set, make it now, otherwise return None.
+        Making it means importing and building the game
+        """
+        key = game.key
+        mtime = game.mtime
+
+        entry = self.entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            return self.get_area(entry["slot"])
+        if not create:
+            return None
+
+        #reuse the slot of an out of date thumbnail
+        if entry is not None:
+            slot = entry["slot"]
+        else:
+            slot = len(self.entries)
+        self.grow( (slot // self.columns) + 1 )
+
+        game_instance = game.load()()
+        thumbnail = pygame.transform.scale(game_instance.get_thumbnail(), (self.thumbnail_width, self.thumbnail_height))
+
+        area = self.get_area(slot)
+        self.surf.fill((0,0,0,0), area)
+        self.surf.blit(thumbnail, area)
+
+        self.entries[key] = {"slot":slot, "mtime":mtime}
+        self.dirty = True
+        if self.dirty_time is None:
+            self.dirty_time = pygame.time.get_ticks()
+
+        return area
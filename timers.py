@@ -0,0 +1,186 @@
+"""
+This is a file for timers that run on the game clock.
+The clock is moved forward by the main loop each frame, so timers can be paused, cancelled and sped up,
+and timers belonging to a microgame can all be cancelled when it ends.
+Timers are kept in a min-heap, so adding, cancelling and firing a timer is O(log n)
+"""
+import heapq
+
+class Timer:
+    """
+    A function that will be called after a delay. Use TimerScheduler.add to make these
+    """
+    def __init__(self, scheduler, delay, function, args, owner, repeat):
+        self.scheduler = scheduler
+        self.delay = delay
+        self.function = function
+        self.args = args
+        self.owner = owner
+        #whether to keep firing every delay ms, rather than just once
+        self.repeat = repeat
+
+        #the clock time this is due at
+        self.due = scheduler.time + delay
+        #which heap entry is the live one for this timer, older entries are skipped
+        self.entry_id = None
+
+        #whether this has fired (if it doesn't repeat) or been cancelled
+        self.done = False
+        self.paused = False
+        #time left when paused
+        self.remaining = None
+
+    def get_remaining(self):
+        """
+        Get how long (ms of game clock) until this timer fires
+        """
+        if self.done:
+            return 0
+        if self.paused:
+            return self.remaining
+        return max(self.due - self.scheduler.time, 0)
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def pause(self):
+        self.scheduler.pause(self)
+
+    def resume(self):
+        self.scheduler.resume(self)
+
+class TimerScheduler:
+    """
+    Keeps track of timers, firing them as the game clock moves forward
+    """
+    def __init__(self):
+        #the game clock, in ms
+        self.time = 0
+        #how fast the clock runs, e.g. 1.5 for speed-up rounds
+        self.time_scale = 1.0
+
+        #heap of (due, entry id, timer)
+        self.heap = []
+        self.next_entry_id = 0
+        #how many heap entries are for timers that were cancelled, paused or moved
+        self.stale_entries = 0
+
+        #owner -> set of timers that haven't fired yet
+        self.owners = {}
+
+        #how many times timers have fired, for checking replays fire the same timers
+        self.fired = 0
+
+    def __len__(self):
+        return len(self.heap) - self.stale_entries
+
+    def push(self, timer):
+        timer.entry_id = self.next_entry_id
+        self.next_entry_id += 1
+        heapq.heappush(self.heap, (timer.due, timer.entry_id, timer))
+
+    def add(self, delay, function, *args, owner=None, repeat=False):
+        """
+        Call function(*args) after delay ms of game clock, returning the Timer.
+        If an owner is given, the timer can be paused or cancelled along with the owner's other timers
+        """
+        if repeat and delay <= 0:
+            raise ValueError("repeating timers need a delay above 0")
+
+        timer = Timer(self, delay, function, args, owner, repeat)
+        self.push(timer)
+
+        if owner is not None:
+            self.owners.setdefault(owner, set()).add(timer)
+
+        return timer
+
+    def forget(self, timer):
+        """
+        Stop tracking a timer by its owner
+        """
+        if timer.owner is not None:
+            owned = self.owners.get(timer.owner)
+            if owned is not None:
+                owned.discard(timer)
+                if not owned:
+                    del self.owners[timer.owner]
+
+    def mark_stale(self):
+        self.stale_entries += 1
+        #get rid of dead entries once they make up most of the heap
+        if self.stale_entries > 64 and self.stale_entries*2 > len(self.heap):
+            self.heap = [entry for entry in self.heap if entry[1] == entry[2].entry_id]
+            heapq.heapify(self.heap)
+            self.stale_entries = 0
+
+    def cancel(self, timer):
+        if timer.done:
+            return
+        timer.done = True
+        self.forget(timer)
+        if not timer.paused:
+            timer.entry_id = None
+            self.mark_stale()
+
+    def pause(self, timer):
+        if timer.done or timer.paused:
+            return
+        timer.paused = True
+        timer.remaining = max(timer.due - self.time, 0)
+        timer.entry_id = None
+        self.mark_stale()
+
+    def resume(self, timer):
+        if timer.done or not timer.paused:
+            return
+        timer.paused = False
+        timer.due = self.time + timer.remaining
+        timer.remaining = None
+        self.push(timer)
+
+    def get_owned(self, owner):
+        return list(self.owners.get(owner, ()))
+
+    def cancel_owner(self, owner):
+        """
+        Cancel every timer belonging to an owner
+        """
+        for timer in self.get_owned(owner):
+            self.cancel(timer)
+
+    def pause_owner(self, owner):
+        for timer in self.get_owned(owner):
+            self.pause(timer)
+
+    def resume_owner(self, owner):
+        for timer in self.get_owned(owner):
+            self.resume(timer)
+
+    def update(self, dt):
+        """
+        Move the clock forward by dt ms (scaled by time_scale), firing every timer that is now due.
+        This is called once per frame by the main loop
+        """
+        self.time += dt*self.time_scale
+
+        heap = self.heap
+        while heap and heap[0][0] <= self.time:
+            due, entry_id, timer = heapq.heappop(heap)
+            if entry_id != timer.entry_id:
+                self.stale_entries -= 1
+                continue
+
+            if timer.repeat:
+                timer.due += timer.delay
+                self.push(timer)
+            else:
+                timer.entry_id = None
+                timer.done = True
+                self.forget(timer)
+
+            self.fired += 1
+            timer.function(*timer.args)
+
+            #the function may have replaced the heap while compacting
+            heap = self.heap